@@ -0,0 +1,108 @@
+import calendar
+import datetime
+
+import numpy as np
+
+# Months of history loaded for every pass: the current month, a full year for the seasonal
+# comparison and a full z-score window before that
+HISTORY_MONTHS = 25
+# Complete months a category's spending is compared against
+ZSCORE_WINDOW = 6
+# Fewest active months before a z-score means anything
+ZSCORE_MIN_MONTHS = 3
+ZSCORE_THRESHOLD = 2.0
+
+
+def _month_index(ym):
+    return (ym // 100) * 12 + ym % 100 - 1
+
+
+def _ym(index):
+    return (index // 12) * 100 + index % 12 + 1
+
+
+def spending_matrix(totals, today, months=HISTORY_MONTHS):
+    # (category ids, year-month numbers, matrix) from (category id, year-month, total) rows, where
+    # matrix[i, j] is category i's spending in month j; the last column is the month containing
+    # today. Months outside the window are dropped.
+    last = today.year * 12 + today.month - 1
+    first = last - months + 1
+    rows = np.array([row for row in totals if row[2]], dtype=np.float64).reshape(-1, 3)
+    index = _month_index(rows[:, 1].astype(np.int64)) - first
+    rows, index = rows[(index >= 0) & (index < months)], index[(index >= 0) & (index < months)]
+    cat_ids = np.unique(rows[:, 0].astype(np.int64))
+    matrix = np.zeros((len(cat_ids), months))
+    np.add.at(matrix, (np.searchsorted(cat_ids, rows[:, 0].astype(np.int64)), index), rows[:, 2])
+    return cat_ids, [_ym(i) for i in range(first, last + 1)], matrix
+
+
+def project_month_end(matrix, today, window=ZSCORE_WINDOW):
+    # End-of-month projection of the last column: what is spent so far plus the rest of the month
+    # at a rate that blends the month-to-date pace with the trailing average, weighted by how much
+    # of the month has passed (early in the month the history dominates)
+    days = calendar.monthrange(today.year, today.month)[1]
+    elapsed = today.day / days
+    spent = matrix[:, -1]
+    history = matrix[:, -1 - window:-1]
+    typical = history.mean(axis=1) if history.shape[1] else np.zeros(len(spent))
+    pace = spent / elapsed
+    return spent + (1 - elapsed) * (elapsed * pace + (1 - elapsed) * typical)
+
+
+def rolling_zscores(matrix, window=ZSCORE_WINDOW, min_months=ZSCORE_MIN_MONTHS):
+    # z[i, j] compares month j with the up-to-window months before it, counting only months since
+    # category i first had spending (so a new category's first bills aren't flagged); NaN where
+    # there is too little history or no variation. Prefix sums make every window O(1).
+    n, m = matrix.shape
+    sums = np.zeros((n, m + 1))
+    squares = np.zeros((n, m + 1))
+    np.cumsum(matrix, axis=1, out=sums[:, 1:])
+    np.cumsum(matrix * matrix, axis=1, out=squares[:, 1:])
+    active = matrix > 0
+    first = np.where(active.any(axis=1), active.argmax(axis=1), m)
+    cols = np.arange(m)
+    lo = np.maximum(cols[None, :] - window, first[:, None])
+    hi = np.broadcast_to(cols, (n, m))
+    count = hi - lo
+    safe_count = np.maximum(count, 1)
+    mean = (np.take_along_axis(sums, hi, 1) - np.take_along_axis(sums, lo, 1)) / safe_count
+    var = (np.take_along_axis(squares, hi, 1) - np.take_along_axis(squares, lo, 1)) / safe_count - mean * mean
+    std = np.sqrt(np.maximum(var, 0))
+    valid = (count >= min_months) & (std > 1e-9)
+    z = np.full((n, m), np.nan)
+    np.divide(matrix - mean, std, out=z, where=valid)
+    return z
+
+
+def spending_insights(totals, today=None, threshold=ZSCORE_THRESHOLD):
+    # Everything the Trends & Insights card shows, for all expense categories in one pass over
+    # (category id, year-month, total) rows. The app passes BudgetEngine.spent, which the journal
+    # already keeps current, so a refresh never rescans the ledger.
+    today = today or datetime.date.today()
+    cat_ids, months, matrix = spending_matrix(totals, today)
+    projected = project_month_end(matrix, today)
+    # Score the current month on its projection rather than its partial total
+    scored = matrix.copy()
+    scored[:, -1] = projected
+    z = rolling_zscores(scored)
+    anomalies = []
+    for col in (-2, -1):
+        flagged = np.flatnonzero(np.abs(np.nan_to_num(z[:, col])) >= threshold)
+        anomalies.extend((int(cat_ids[i]), months[col], float(scored[i, col]), float(z[i, col])) for i in flagged)
+    anomalies.sort(key=lambda item: -abs(item[3]))
+    last_year = matrix[:, -13] if len(months) >= 13 else np.zeros(len(cat_ids))
+    change = projected - last_year
+    seasonal = [(int(cat_ids[i]), float(projected[i]), float(last_year[i])) for i in np.argsort(-np.abs(change))
+                if change[i] and last_year[i] > 0][:3]
+    return {
+        'month': months[-1],
+        'spent': float(matrix[:, -1].sum()),
+        'projected': float(projected.sum()),
+        'last_month': float(matrix[:, -2].sum()) if len(months) > 1 else 0.0,
+        'last_year': float(last_year.sum()),
+        'projections': {int(cid): float(value) for cid, value in zip(cat_ids, projected)},
+        # (category id, year-month, amount, z) for the last complete and the current month
+        'anomalies': anomalies,
+        # (category id, projected this month, same month last year), largest changes first
+        'seasonal': seasonal,
+    }
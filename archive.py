@@ -0,0 +1,133 @@
+import os
+import re
+import sqlite3
+import datetime
+from contextlib import contextmanager
+
+import balances
+import sync
+from dates import to_day, SQL_DATE_TEXT
+from queries import stored_columns
+
+# Closed years are moved into sibling files named after the main database, e.g. finance_tracker_2021.db
+ARCHIVE_SUFFIX = '_{year}.db'
+
+
+def main_db_path(conn):
+    for _, name, path in conn.execute('PRAGMA database_list').fetchall():
+        if name == 'main':
+            return path
+    return ''
+
+
+def archive_path(conn, year):
+    base, _ = os.path.splitext(main_db_path(conn))
+    return base + ARCHIVE_SUFFIX.format(year=year)
+
+
+def archived_years(conn):
+    # [(year, file name, row count)] for every year that has been moved out of the main table
+    c = conn.cursor()
+    c.execute('SELECT year, path, row_count FROM archived_years ORDER BY year')
+    return c.fetchall()
+
+
+def archivable_years(conn):
+    # Years before the current one that still have rows in the main table
+    c = conn.cursor()
+    c.execute('SELECT DISTINCT ym / 100 FROM transactions WHERE day < ? ORDER BY 1',
+              (datetime.date(datetime.date.today().year, 1, 1).toordinal(),))
+    return [row[0] for row in c.fetchall()]
+
+
+def archive_year(conn, year):
+    # Moves every transaction dated in year into its own database file and keeps per-day
+    # rollups of the moved rows in the main database, so totals never need the archive file.
+    if year >= datetime.date.today().year:
+        raise ValueError('Only closed years can be archived.')
+    start, end = datetime.date(year, 1, 1).toordinal(), datetime.date(year, 12, 31).toordinal()
+    path = archive_path(conn, year)
+    alias = f'archive_{year}'
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('ATTACH DATABASE ? AS ' + alias, (path,))
+    try:
+        c = conn.cursor()
+        c.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='transactions'")
+        create_sql = re.sub(r'^CREATE TABLE\s+"?transactions"?', f'CREATE TABLE IF NOT EXISTS {alias}.transactions',
+                            c.fetchone()[0])
+        with conn:
+            c.execute(create_sql)
+            # A partition made by an older schema may lack newer columns; copy what both sides have
+            target = set(stored_columns(conn, 'transactions', alias))
+            cols = ', '.join(col for col in stored_columns(conn, 'transactions') if col in target)
+            c.execute(f'CREATE INDEX IF NOT EXISTS {alias}.idx_transactions_day ON transactions (day)')
+            c.execute(f'''INSERT INTO {alias}.transactions ({cols})
+                          SELECT {cols} FROM main.transactions WHERE day BETWEEN ? AND ?''', (start, end))
+            moved = c.rowcount
+            c.execute('''INSERT INTO archive_rollups (day, type, category_id, total, n)
+                         SELECT day, type, category_id, SUM(amount), COUNT(*) FROM main.transactions
+                         WHERE day BETWEEN ? AND ? GROUP BY day, type, category_id
+                         ON CONFLICT (day, type, category_id)
+                         DO UPDATE SET total = total + excluded.total, n = n + excluded.n''', (start, end))
+            # Archived rows still count towards net worth
+            balances.carry_over(conn, start, end)
+            # Moving rows out is not a delete to sync; their log entries go with them
+            c.execute('''DELETE FROM sync_changes WHERE tbl='transactions' AND uid IN
+                         (SELECT uid FROM main.transactions WHERE day BETWEEN ? AND ?)''', (start, end))
+            with sync.untracked(conn):
+                c.execute('DELETE FROM main.transactions WHERE day BETWEEN ? AND ?', (start, end))
+            c.execute('''INSERT INTO archived_years (year, path, row_count, archived_at) VALUES (?, ?, ?, ?)
+                         ON CONFLICT (year) DO UPDATE SET row_count = row_count + excluded.row_count,
+                         archived_at = excluded.archived_at''',
+                      (year, os.path.basename(path), moved, datetime.datetime.now().isoformat(timespec='seconds')))
+    finally:
+        conn.execute('DETACH DATABASE ' + alias)
+    return moved
+
+
+@contextmanager
+def attached_partitions(conn, start, end):
+    # Attaches only the archive files whose year overlaps [start, end]; yields their schema aliases
+    c = conn.cursor()
+    c.execute('SELECT year, path FROM archived_years WHERE year BETWEEN ? AND ?',
+              (datetime.date.fromordinal(to_day(start)).year, datetime.date.fromordinal(to_day(end)).year))
+    folder = os.path.dirname(main_db_path(conn))
+    attached = set(row[1] for row in conn.execute('PRAGMA database_list').fetchall())
+    aliases = []
+    newly_attached = []
+    for year, path in c.fetchall():
+        alias = f'archive_{year}'
+        full_path = os.path.join(folder, path)
+        if alias not in attached:
+            if not os.path.exists(full_path):
+                continue
+            conn.execute('ATTACH DATABASE ? AS ' + alias, (full_path,))
+            newly_attached.append(alias)
+        aliases.append(alias)
+    try:
+        yield aliases
+    finally:
+        for alias in newly_attached:
+            try:
+                conn.execute('DETACH DATABASE ' + alias)
+            except sqlite3.OperationalError:
+                pass
+
+
+def range_transactions(conn, start, end, limit=None):
+    # Rows dated in [start, end] from the live table plus the archive partitions the range overlaps,
+    # newest first, as (type, category, amount, date, description)
+    start, end = to_day(start), to_day(end)
+    with attached_partitions(conn, start, end) as aliases:
+        sources = ['main.transactions'] + [f'{alias}.transactions' for alias in aliases]
+        union = ' UNION ALL '.join(
+            f'SELECT id, type, category_id, amount, day, description FROM {src} WHERE day BETWEEN ? AND ?'
+            for src in sources)
+        sql = f'''SELECT t.type, c.name, t.amount, {SQL_DATE_TEXT.format(col='t.day')}, t.description
+                  FROM ({union}) t JOIN categories c ON t.category_id=c.id ORDER BY t.day DESC, t.id DESC'''
+        params = [start, end] * len(sources)
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return conn.execute(sql, params).fetchall()
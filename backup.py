@@ -0,0 +1,121 @@
+import os
+import gzip
+import glob
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import datetime
+
+BACKUP_DIR = 'backups'
+# Pages copied per backup step, and the pause between steps that lets other work through
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.002
+# Snapshots kept after rotation
+BACKUP_KEEP = 10
+SNAPSHOT_SUFFIX = '.db.gz'
+
+
+def backup_dir_for(db_file):
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), BACKUP_DIR)
+
+
+def list_snapshots(backup_dir):
+    # Snapshot paths, newest first (the timestamped names sort chronologically)
+    return sorted(glob.glob(os.path.join(backup_dir, '*' + SNAPSHOT_SUFFIX)), reverse=True)
+
+
+def create_snapshot(db_file, backup_dir, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP):
+    # Copies the database with the online backup API in small steps, then gzips the copy.
+    # The source connection holds one read transaction for the whole copy: under WAL that pins a
+    # consistent snapshot, so concurrent commits neither block on the backup nor restart it.
+    os.makedirs(backup_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(db_file))[0]
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(backup_dir, f'{name}-{stamp}{SNAPSHOT_SUFFIX}')
+    fd, tmp_path = tempfile.mkstemp(suffix='.db', dir=backup_dir)
+    os.close(fd)
+    try:
+        src = sqlite3.connect(db_file)
+        dst = sqlite3.connect(tmp_path)
+        try:
+            src.execute('BEGIN')
+            src.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+            src.backup(dst, pages=pages, sleep=sleep)
+            src.rollback()
+            # Snapshots are standalone files; keep them out of WAL mode
+            dst.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            dst.close()
+            src.close()
+        with open(tmp_path, 'rb') as raw, gzip.open(path + '.part', 'wb', compresslevel=6) as packed:
+            shutil.copyfileobj(raw, packed, 1024 * 1024)
+        os.replace(path + '.part', path)
+    finally:
+        for leftover in (tmp_path, path + '.part'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return path
+
+
+def rotate_snapshots(backup_dir, keep=BACKUP_KEEP):
+    removed = 0
+    for path in list_snapshots(backup_dir)[keep:]:
+        os.remove(path)
+        removed += 1
+    return removed
+
+
+def restore_snapshot(conn, snapshot_path):
+    # Replaces the live database behind conn with the snapshot's contents in one backup call
+    fd, tmp_path = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(snapshot_path))
+    os.close(fd)
+    try:
+        with gzip.open(snapshot_path, 'rb') as packed, open(tmp_path, 'wb') as raw:
+            shutil.copyfileobj(packed, raw, 1024 * 1024)
+        src = sqlite3.connect(tmp_path)
+        try:
+            if conn.in_transaction:
+                conn.commit()
+            src.backup(conn)
+        finally:
+            src.close()
+    finally:
+        os.remove(tmp_path)
+
+
+class BackupScheduler:
+    # Runs snapshots on a worker thread so the UI thread never waits on one. The UI polls
+    # running()/last_result from after() callbacks.
+
+    def __init__(self, db_file, backup_dir=None, keep=BACKUP_KEEP):
+        self.db_file = db_file
+        self.backup_dir = backup_dir or backup_dir_for(db_file)
+        self.keep = keep
+        # ('ok', path, seconds, bytes) or ('error', message, seconds, 0) for the last finished run
+        self.last_result = None
+        self._thread = None
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running():
+            return False
+        self._thread = threading.Thread(target=self._run, name='ledger-backup', daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            path = create_snapshot(self.db_file, self.backup_dir)
+            rotate_snapshots(self.backup_dir, self.keep)
+            self.last_result = ('ok', path, time.perf_counter() - started, os.path.getsize(path))
+        except (OSError, sqlite3.Error) as e:
+            self.last_result = ('error', str(e), time.perf_counter() - started, 0)
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,97 @@
+from dates import to_day
+
+# daily_balance keeps one row per day that has transactions: that day's net (income minus
+# expense) and the running balance through the end of it. Triggers on transactions only adjust
+# the day's net and lower balance_state.dirty_from, which is O(1) per row even for bulk writes;
+# the next read re-bases the running balances from dirty_from onward in one windowed UPDATE, so
+# a back-dated edit only touches later days. Lookups are a primary-key seek.
+
+_SIGNED = "(CASE {row}.type WHEN 'Income' THEN {row}.amount ELSE -{row}.amount END)"
+
+
+def _apply(row, sign):
+    return f'''INSERT INTO daily_balance (day, net, balance) VALUES ({row}.day, {sign}{_SIGNED.format(row=row)}, 0)
+                   ON CONFLICT (day) DO UPDATE SET net = net + excluded.net;
+               UPDATE balance_state SET dirty_from = MIN(COALESCE(dirty_from, {row}.day), {row}.day);'''
+
+
+BALANCE_TRIGGERS = (
+    f'''CREATE TRIGGER IF NOT EXISTS trg_balance_insert AFTER INSERT ON transactions
+        BEGIN {_apply('NEW', '+')} END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_balance_delete AFTER DELETE ON transactions
+        BEGIN {_apply('OLD', '-')} END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_balance_update AFTER UPDATE OF amount, day, type ON transactions
+        BEGIN {_apply('OLD', '-')} {_apply('NEW', '+')} END''',
+)
+
+
+def rebuild(conn):
+    # Recomputes the whole table from the live rows plus archived rollups
+    with conn:
+        conn.execute('DELETE FROM daily_balance')
+        conn.execute('''INSERT INTO daily_balance (day, net, balance)
+                        SELECT day, net, SUM(net) OVER (ORDER BY day) FROM (
+                            SELECT day, SUM(CASE type WHEN 'Income' THEN amount ELSE -amount END) AS net FROM (
+                                SELECT day, type, amount FROM transactions
+                                UNION ALL
+                                SELECT day, type, total FROM archive_rollups
+                            ) GROUP BY day
+                        )''')
+        conn.execute('UPDATE balance_state SET dirty_from = NULL')
+
+
+def carry_over(conn, start, end):
+    # For rows about to leave transactions without leaving the ledger (archiving): adds their day
+    # nets back in advance, so the delete triggers that follow leave every balance unchanged
+    conn.execute('''INSERT INTO daily_balance (day, net, balance)
+                    SELECT day, SUM(CASE type WHEN 'Income' THEN amount ELSE -amount END), 0
+                    FROM main.transactions WHERE day BETWEEN ? AND ? GROUP BY day
+                    ON CONFLICT (day) DO UPDATE SET net = net + excluded.net''', (to_day(start), to_day(end)))
+
+
+def rebase(conn):
+    # Brings running balances up to date after writes; a no-op when nothing changed
+    dirty = conn.execute('SELECT dirty_from FROM balance_state').fetchone()
+    if dirty is None or dirty[0] is None:
+        return
+    dirty = dirty[0]
+    # A savepoint rather than a commit: inside a caller's open transaction (the write queue's
+    # group-commit batch) the re-base rides along with it instead of committing it early
+    conn.execute('SAVEPOINT balances_rebase')
+    try:
+        base = conn.execute('SELECT balance FROM daily_balance WHERE day < ? ORDER BY day DESC LIMIT 1',
+                            (dirty,)).fetchone()
+        # Days whose rows all cancelled out (or were deleted) no longer need an entry
+        conn.execute('DELETE FROM daily_balance WHERE day >= ? AND ABS(net) < 1e-9', (dirty,))
+        conn.execute('''UPDATE daily_balance SET balance = ? + r.running
+                        FROM (SELECT day, SUM(net) OVER (ORDER BY day) AS running
+                              FROM daily_balance WHERE day >= ?) r
+                        WHERE daily_balance.day = r.day''', (base[0] if base else 0, dirty))
+        conn.execute('UPDATE balance_state SET dirty_from = NULL')
+    except BaseException:
+        conn.execute('ROLLBACK TO balances_rebase')
+        conn.execute('RELEASE balances_rebase')
+        raise
+    conn.execute('RELEASE balances_rebase')
+
+
+def balance_at(conn, day):
+    # Net worth at the end of day: the running balance of the last entry on or before it
+    rebase(conn)
+    row = conn.execute('SELECT balance FROM daily_balance WHERE day <= ? ORDER BY day DESC LIMIT 1',
+                       (to_day(day),)).fetchone()
+    return row[0] if row else 0
+
+
+def balance_series(conn, start, end):
+    # [(day, balance)] for every day in [start, end] with transactions, starting with the opening
+    # balance on start itself, so the series can be drawn as steps
+    start, end = to_day(start), to_day(end)
+    opening = balance_at(conn, start - 1)
+    rows = conn.execute('SELECT day, balance FROM daily_balance WHERE day BETWEEN ? AND ? ORDER BY day',
+                        (start, end)).fetchall()
+    if not rows or rows[0][0] != start:
+        rows.insert(0, (start, opening))
+    if rows[-1][0] != end:
+        rows.append((end, rows[-1][1]))
+    return rows
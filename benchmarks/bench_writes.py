@@ -0,0 +1,130 @@
+"""Write-throughput benchmark for data entry: one commit per journal write vs. the group-commit
+WriteQueue (write_queue.py).
+
+Creates a scratch ledger, then adds --count transactions and edits each one's amount, first
+committing every write on its own (the old behaviour) and then through a WriteQueue whose
+window timer is driven by a simulated event loop. Every write goes through the same journal
+listeners as in the app (budgets, range index) plus the data side of the dashboard refresh the
+app runs after each change (range totals, running balance re-base and series, recent rows,
+insights, budget alerts), so anything on that path that commits early shows up. Commits are
+counted from a second connection watching PRAGMA data_version, i.e. what actually reached the
+file. Reports writes/s, commits and latency percentiles per write.
+
+    python benchmarks/bench_writes.py --count 2000
+"""
+import argparse
+import datetime
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+import archive  # noqa: E402
+import balances  # noqa: E402
+import dedupe  # noqa: E402
+from budgets import BudgetEngine  # noqa: E402
+from common import percentile  # noqa: E402
+from fenwick import RangeIndex  # noqa: E402
+from journal import EditJournal  # noqa: E402
+from main import init_db  # noqa: E402
+from write_queue import WriteQueue, WRITE_WINDOW_MS, WRITE_BATCH_OPS  # noqa: E402
+
+
+class Timers:
+    # Stand-in for Tk's after(): callbacks run from tick() once their delay has passed
+    def __init__(self):
+        self.due = []
+
+    def after(self, ms, callback):
+        self.due.append((time.perf_counter() + ms / 1000, callback))
+
+    def tick(self, force=False):
+        now = time.perf_counter()
+        ready = [item for item in self.due if force or item[0] <= now]
+        self.due = [item for item in self.due if item not in ready]
+        for _, callback in ready:
+            callback()
+
+
+def dashboard_refresh(conn, budgets, range_index):
+    # What FinanceTrackerApp.refresh_dashboard reads after every journal change, minus the widgets
+    def refresh(ops):
+        today = datetime.date.today()
+        start = today.replace(day=1)
+        range_index.totals(start, today)
+        balances.rebase(conn)
+        balances.balance_series(conn, start, today)
+        archive.range_transactions(conn, start, today, limit=6)
+        analytics.spending_insights(budgets.monthly_spent(), today)
+        budgets.alerts(start.year * 100 + start.month)
+    return refresh
+
+
+def run(db_file, count, queued, window_ms, max_ops):
+    conn = sqlite3.connect(db_file)
+    journal = EditJournal(conn)
+    journal.row_hooks['transactions'] = dedupe.row_fingerprint
+    budgets = BudgetEngine()
+    budgets.load(conn)
+    range_index = RangeIndex()
+    range_index.load(conn)
+    journal.listeners += [budgets.apply, range_index.apply, dashboard_refresh(conn, budgets, range_index)]
+    timers = Timers()
+    writes = WriteQueue(journal, timers.after, window_ms, max_ops)
+    observer = sqlite3.connect(db_file)
+    version = observer.execute('PRAGMA data_version').fetchone()[0]
+    commits = 0
+    latencies = []
+    rowids = []
+    today = datetime.date.today().toordinal()
+    started = time.perf_counter()
+    for i in range(count * 2):
+        begun = time.perf_counter()
+        if i < count:
+            args = ('transactions', {'amount': 1.0 + i, 'category_id': 9, 'day': today - i % 60,
+                                     'description': f'bench {i}', 'type': 'Expense'})
+            write = journal.insert
+        else:
+            args = ('transactions', rowids[i - count], {'amount': 2.0 + i})
+            write = journal.update
+        result = writes.submit(write, *args) if queued else write(*args)
+        if i < count:
+            rowids.append(result)
+        timers.tick()
+        latencies.append(time.perf_counter() - begun)
+        seen = observer.execute('PRAGMA data_version').fetchone()[0]
+        commits += seen != version
+        version = seen
+    timers.tick(force=True)
+    writes.flush()
+    elapsed = time.perf_counter() - started
+    commits += observer.execute('PRAGMA data_version').fetchone()[0] != version
+    observer.close()
+    conn.close()
+    return elapsed, commits, latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--count', type=int, default=2000, help='transactions to add (each is then edited once)')
+    parser.add_argument('--window-ms', type=int, default=WRITE_WINDOW_MS)
+    parser.add_argument('--max-ops', type=int, default=WRITE_BATCH_OPS)
+    args = parser.parse_args(argv)
+    print(f'{"mode":<14}{"writes/s":>10}{"commits":>9}{"p50 ms":>9}{"p99 ms":>9}{"mean ms":>9}')
+    for name, queued in (('per-write', False), ('group commit', True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file = os.path.join(tmp, 'bench.db')
+            init_db(db_file)
+            elapsed, commits, latencies = run(db_file, args.count, queued, args.window_ms, args.max_ops)
+        ms = [value * 1000 for value in latencies]
+        print(f'{name:<14}{len(latencies) / elapsed:>10,.0f}{commits:>9}{percentile(ms, 50):>9.3f}'
+              f'{percentile(ms, 99):>9.3f}{statistics.mean(ms):>9.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+"""Helpers shared by the benchmark scripts in this directory."""
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile of values (pct in 0-100)
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
@@ -0,0 +1,95 @@
+"""Load test for the ledger API (`python main.py serve`).
+
+Opens --concurrency keep-alive connections against a running server, and each sends
+--requests requests: a mix of paged transaction lists, range totals and category breakdowns,
+plus inserts at --write-ratio. Reports throughput and latency percentiles per endpoint.
+
+    python main.py serve &
+    python benchmarks/load_test.py --concurrency 2000 --requests 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+
+from common import percentile
+
+READ_TARGETS = [
+    ('totals', '/totals'),
+    ('totals', '/totals?start=2020-01-01&end=2030-12-31'),
+    ('transactions', '/transactions?page=1&size=50'),
+    ('transactions', '/transactions?page=3&size=20'),
+    ('categories', '/categories?type=Expense'),
+]
+INSERT_BODY = {'type': 'Expense', 'category': 'Miscellaneous', 'amount': 1.25, 'description': 'load test'}
+
+
+async def client(host, port, n_requests, write_ratio, latencies, errors):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        errors['connect'] += 1
+        return
+    try:
+        for _ in range(n_requests):
+            if random.random() < write_ratio:
+                name = 'insert'
+                body = json.dumps(INSERT_BODY).encode()
+                request = (f'POST /transactions HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                           f'Content-Length: {len(body)}\r\n\r\n').encode() + body
+            else:
+                name, target = random.choice(READ_TARGETS)
+                request = f'GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode()
+            started = time.perf_counter()
+            writer.write(request)
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            latencies[name].append(time.perf_counter() - started)
+            if b' 200 ' not in status_line and b' 201 ' not in status_line:
+                errors[name] += 1
+    except (ConnectionError, asyncio.IncompleteReadError):
+        errors['connection'] += 1
+    finally:
+        writer.close()
+
+
+async def run(args):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    started = time.perf_counter()
+    await asyncio.gather(*(client(args.host, args.port, args.requests, args.write_ratio, latencies, errors)
+                           for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    total = sum(len(values) for values in latencies.values())
+    print(f'{total} requests over {args.concurrency} connections in {elapsed:.2f}s '
+          f'({total / elapsed:,.0f} req/s)')
+    print(f'{"endpoint":<14}{"count":>8}{"p50 ms":>10}{"p99 ms":>10}{"mean ms":>10}')
+    for name, values in sorted(latencies.items()):
+        print(f'{name:<14}{len(values):>8}{percentile(values, 50) * 1000:>10.2f}'
+              f'{percentile(values, 99) * 1000:>10.2f}{statistics.mean(values) * 1000:>10.2f}')
+    if errors:
+        print('errors:', dict(errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--concurrency', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=20, help='requests per connection')
+    parser.add_argument('--write-ratio', type=float, default=0.02)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""Interaction latency benchmark for the desktop app.
+
+Generates a ledger of --rows transactions in a scratch directory, starts FinanceTrackerApp on
+it (under a private Xvfb server when DISPLAY is unset) and fires user actions through Tk the
+way a user would: Add on the transaction form, <<ComboboxSelected>> on the dashboard range
+(custom ranges included), <Double-1> cell edits committed with <Return>, and tab switches.
+Each action is timed until Tk is idle again (no events pending and no chunked list load
+still streaming). Reports p50/p99 per action; --json also writes them to a file, for
+comparing releases.
+
+    python benchmarks/ui_latency.py --rows 200000 --iterations 50
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from common import percentile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RANGES = ['This Month', 'Last Month', 'Last 3 Months', 'This Year']
+DESCRIPTIONS = ['Grocery store', 'Coffee', 'Fuel', 'Electric bill', 'Streaming', 'Pharmacy', 'Restaurant',
+                'Salary', 'Book shop', 'Taxi']
+
+
+def start_display():
+    # A private virtual X server when there is no display; returns the process to stop, or None
+    if os.environ.get('DISPLAY'):
+        return None
+    if not shutil.which('Xvfb'):
+        sys.exit('DISPLAY is not set and Xvfb is not installed.')
+    display = f':{random.randint(100, 999)}'
+    server = subprocess.Popen(['Xvfb', display, '-screen', '0', '1280x1024x24', '-nolisten', 'tcp'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ['DISPLAY'] = display
+    time.sleep(1)
+    if server.poll() is not None:
+        sys.exit('Xvfb failed to start.')
+    return server
+
+
+def generate_ledger(db_file, rows, years):
+    import main
+
+    main.init_db(db_file)
+    conn = sqlite3.connect(db_file)
+    c = conn.cursor()
+    c.execute('SELECT id, type FROM categories')
+    categories = c.fetchall()
+    today = datetime.date.today().toordinal()
+    batch = []
+    for i in range(rows):
+        cat_id, ttype = random.choice(categories)
+        amount = round(random.uniform(1000, 5000) if ttype == 'Income' else random.lognormvariate(3, 1), 2)
+        batch.append((amount, cat_id, today - random.randint(0, years * 365), random.choice(DESCRIPTIONS), ttype))
+    with conn:
+        c.executemany('INSERT INTO transactions (amount, category_id, day, description, type) VALUES (?, ?, ?, ?, ?)',
+                      batch)
+    conn.close()
+    # Derived state (fingerprints, balances) is filled in by the app's own startup path
+    main.init_db(db_file)
+
+
+class Driver:
+    def __init__(self, app):
+        self.app = app
+        self.timings = defaultdict(list)
+
+    def settle(self):
+        # Runs the event loop until nothing is pending, including chunked Treeview loads
+        self.app.update()
+        while self.app._tree_load_jobs:
+            self.app.update()
+            time.sleep(0.0005)
+        self.app.update()
+
+    def timed(self, name, action):
+        self.settle()
+        started = time.perf_counter()
+        action()
+        self.settle()
+        self.timings[name].append(time.perf_counter() - started)
+
+    def add_transaction(self):
+        app = self.app
+        app.tabs.select(app.tab_transactions)
+        self.settle()
+
+        def action():
+            app.ent_amount.delete(0, 'end')
+            app.ent_amount.insert(0, f'{random.uniform(1, 200):.2f}')
+            app.ent_desc.delete(0, 'end')
+            app.ent_desc.insert(0, f'{random.choice(DESCRIPTIONS)} {random.randint(0, 10 ** 9)}')
+            app.add_transaction()
+
+        self.timed('add transaction', action)
+
+    def change_range(self):
+        app = self.app
+        app.tabs.select(app.tab_dashboard)
+        self.settle()
+        if random.random() < 0.5:
+            name = 'range (preset)'
+            value = random.choice(RANGES)
+        else:
+            name = 'range (custom)'
+            value = 'Custom...'
+            today = datetime.date.today()
+            start = today - datetime.timedelta(days=random.randint(30, 1500))
+            end = start + datetime.timedelta(days=random.randint(1, 400))
+            for entry, day in ((app.dash_custom_start, start), (app.dash_custom_end, min(end, today))):
+                entry.delete(0, 'end')
+                entry.insert(0, day.isoformat())
+
+        def action():
+            app.dash_date_range.set(value)
+            app.dash_range_combo.event_generate('<<ComboboxSelected>>')
+
+        self.timed(name, action)
+
+    def edit_cell(self):
+        app = self.app
+        app.tabs.select(app.tab_transactions)
+        self.settle()
+        items = app.tree.get_children()
+        if not items:
+            return
+        item = items[random.randint(0, min(len(items), 20) - 1)]
+        app.tree.see(item)
+        app.tree.selection_set(item)
+        self.settle()
+        bbox = app.tree.bbox(item, '#4')
+        if not bbox:
+            return
+        x, y, width, height = bbox
+
+        def action():
+            app.tree.event_generate('<Double-1>', x=x + width // 2, y=y + height // 2)
+            app.update()
+            editors = [child for child in app.tree.winfo_children() if child.winfo_class() == 'TEntry']
+            if not editors:
+                return
+            editor = editors[-1]
+            editor.delete(0, 'end')
+            editor.insert(0, f'{random.uniform(1, 200):.2f}')
+            editor.event_generate('<Return>')
+
+        self.timed('edit cell', action)
+
+    def switch_tab(self):
+        app = self.app
+        tabs = app.tabs.tabs()
+        current = app.tabs.select()
+        target = random.choice([tab for tab in tabs if tab != current])
+        self.timed('tab switch', lambda: app.tabs.select(target))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=200_000, help='transactions in the generated ledger')
+    parser.add_argument('--years', type=int, default=5, help='years of history the rows are spread over')
+    parser.add_argument('--iterations', type=int, default=30, help='times each action is fired')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+    random.seed(args.seed)
+    server = start_display()
+    tmp = tempfile.mkdtemp(prefix='ui_latency_')
+    try:
+        db_file = os.path.join(tmp, 'finance_tracker.db')
+        started = time.perf_counter()
+        generate_ledger(db_file, args.rows, args.years)
+        print(f'Generated {args.rows:,} transactions in {time.perf_counter() - started:.1f}s')
+
+        import main as app_module
+
+        app_module.DB_FILE = db_file
+        # Dialogs would wait for a click; answer them the way a user pushing through would
+        for name in ('showinfo', 'showerror', 'showwarning'):
+            setattr(app_module.messagebox, name, lambda *a, **k: 'ok')
+        app_module.messagebox.askyesno = lambda *a, **k: True
+        started = time.perf_counter()
+        app = app_module.FinanceTrackerApp()
+        driver = Driver(app)
+        driver.settle()
+        startup = time.perf_counter() - started
+        print(f'Startup to idle: {startup * 1000:.0f} ms')
+        actions = [driver.add_transaction, driver.change_range, driver.edit_cell, driver.switch_tab]
+        for _ in range(args.iterations):
+            for action in random.sample(actions, len(actions)):
+                action()
+        app.on_close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    results = {'rows': args.rows, 'startup_ms': startup * 1000, 'actions': {}}
+    print(f'{"action":<18}{"count":>7}{"p50 ms":>10}{"p99 ms":>10}{"mean ms":>10}{"max ms":>10}')
+    for name, values in sorted(driver.timings.items()):
+        ms = [value * 1000 for value in values]
+        stats = {'count': len(ms), 'p50': percentile(ms, 50), 'p99': percentile(ms, 99),
+                 'mean': statistics.mean(ms), 'max': max(ms)}
+        results['actions'][name] = stats
+        print(f'{name:<18}{stats["count"]:>7}{stats["p50"]:>10.1f}{stats["p99"]:>10.1f}{stats["mean"]:>10.1f}'
+              f'{stats["max"]:>10.1f}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+from dates import ym_of_day
+from queries import LedgerIndex
+
+
+class BudgetEngine(LedgerIndex):
+    # Per-category monthly spending limits. Spent-per-month is loaded once with a single grouped
+    # query and then kept current from journal operations, so each write only re-evaluates the
+    # (category, month) pairs it touched instead of rescanning the ledger.
+
+    def __init__(self):
+        self.limits = {}
+        self.spent = defaultdict(float)
+        # (category_id, year-month number) pairs currently above their limit
+        self.over = set()
+
+    def load(self, conn):
+        c = conn.cursor()
+        c.execute('SELECT category_id, monthly_limit FROM budgets')
+        self.limits = dict(c.fetchall())
+        c.execute('''SELECT category_id, ym, SUM(amount) FROM (
+                         SELECT category_id, ym, amount FROM transactions WHERE type='Expense'
+                         UNION ALL
+                         SELECT category_id, ym, total FROM archive_rollups WHERE type='Expense'
+                     ) GROUP BY category_id, ym''')
+        self.spent = defaultdict(float, {(cat_id, ym): total for cat_id, ym, total in c.fetchall()})
+        self.over = {key for key in self.spent if self._is_over(key)}
+        self._loaded(conn)
+
+    def set_limit(self, conn, category_id, limit):
+        # A limit of None removes the category's budget
+        if limit is None:
+            conn.execute('DELETE FROM budgets WHERE category_id=?', (category_id,))
+            self.limits.pop(category_id, None)
+        else:
+            conn.execute('INSERT OR REPLACE INTO budgets (category_id, monthly_limit) VALUES (?, ?)',
+                         (category_id, limit))
+            self.limits[category_id] = limit
+        conn.commit()
+        for key in [key for key in self.spent if key[0] == category_id]:
+            self._check(key)
+
+    def apply(self, ops):
+        # Journal listener: move each changed row's amount out of its old bucket and into its new
+        # one, and follow limits added or removed through the journal (e.g. deleting a category)
+        for table, rowid, before, after in ops:
+            if table == 'budgets':
+                self._apply_limit(rowid, after)
+                continue
+            if table != 'transactions':
+                continue
+            if before is not None:
+                self._add(before, -1)
+            if after is not None:
+                self._add(after, 1)
+
+    def _apply_limit(self, category_id, row):
+        if row is None:
+            self.limits.pop(category_id, None)
+        else:
+            self.limits[category_id] = row['monthly_limit']
+        for key in [key for key in self.spent if key[0] == category_id]:
+            self._check(key)
+
+    def _add(self, row, sign):
+        if row['type'] != 'Expense':
+            return
+        key = (row['category_id'], ym_of_day(row['day']))
+        self.spent[key] += sign * row['amount']
+        self._check(key)
+
+    def _is_over(self, key):
+        limit = self.limits.get(key[0])
+        return limit is not None and self.spent.get(key, 0) > limit
+
+    def _check(self, key):
+        if self._is_over(key):
+            self.over.add(key)
+        else:
+            self.over.discard(key)
+
+    def monthly_spent(self):
+        # [(category_id, year-month number, spent)] for every category and month with expenses
+        self._fresh()
+        return [(cat_id, ym, total) for (cat_id, ym), total in self.spent.items()]
+
+    def status(self, month):
+        # [(category_id, spent, limit)] for every budgeted category in month (year-month number, e.g. 202610)
+        self._fresh()
+        return [(cat_id, self.spent.get((cat_id, month), 0), limit) for cat_id, limit in self.limits.items()]
+
+    def alerts(self, month):
+        # [(category_id, spent, limit)] for categories over budget in month, worst overrun first
+        self._fresh()
+        rows = [(cat_id, self.spent[(cat_id, m)], self.limits[cat_id]) for cat_id, m in self.over if m == month]
+        return sorted(rows, key=lambda row: row[1] - row[2], reverse=True)
@@ -0,0 +1,32 @@
+import datetime
+
+# Transaction dates are stored as day ordinals (datetime.date.toordinal(), 0001-01-01 == 1).
+# Adding JULIAN_OFFSET turns an ordinal into a Julian day number, which SQLite's date
+# functions accept, e.g. date(day + 1721424.5) gives back the 'YYYY-MM-DD' text.
+JULIAN_OFFSET = 1721424.5
+SQL_DATE_TEXT = f'date({{col}} + {JULIAN_OFFSET})'
+
+
+def to_day(value):
+    # Day ordinal for a date, datetime, 'YYYY-MM-DD' string or ordinal; raises ValueError on bad text
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, datetime.datetime):
+        return value.date().toordinal()
+    if isinstance(value, datetime.date):
+        return value.toordinal()
+    return datetime.datetime.strptime(str(value), '%Y-%m-%d').date().toordinal()
+
+
+def day_to_str(day):
+    return datetime.date.fromordinal(day).isoformat()
+
+
+def ym_of_day(day):
+    d = datetime.date.fromordinal(day)
+    return d.year * 100 + d.month
+
+
+def ym_of(value):
+    # Year-month number for anything to_day() accepts
+    return ym_of_day(to_day(value))
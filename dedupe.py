@@ -0,0 +1,80 @@
+import hashlib
+
+import archive
+
+# Fields that make two transactions "the same": amount (to the cent), category, day, description
+FINGERPRINT_FIELDS = ('amount', 'category_id', 'day', 'description')
+
+
+def normalize_description(description):
+    return ' '.join((description or '').lower().split())
+
+
+def fingerprint(amount, category_id, day, description):
+    # 64-bit signed hash of the normalized fields, so it fits an INTEGER column and a small index
+    key = f'{float(amount):.2f}|{category_id}|{day}|{normalize_description(description)}'
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+def row_fingerprint(row):
+    # Journal row hook: keeps transactions.fingerprint in step with the fields it hashes
+    return {'fingerprint': fingerprint(row['amount'], row['category_id'], row['day'], row['description'])}
+
+
+def backfill_fingerprints(conn):
+    # One set-based UPDATE for rows written before the column existed
+    conn.create_function('fingerprint', 4, fingerprint, deterministic=True)
+    c = conn.execute('UPDATE transactions SET fingerprint = fingerprint(amount, category_id, day, description) '
+                     'WHERE fingerprint IS NULL')
+    conn.commit()
+    return c.rowcount
+
+
+def _archived_fingerprints(conn, start, end):
+    # {fingerprint: id} for rows dated in [start, end] that were moved into archive partitions.
+    # Hashed from the fields, since a partition made before the fingerprint column existed lacks it.
+    found = {}
+    with archive.attached_partitions(conn, start, end) as aliases:
+        for alias in aliases:
+            c = conn.execute(f'SELECT id, {", ".join(FINGERPRINT_FIELDS)} FROM {alias}.transactions '
+                             'WHERE day BETWEEN ? AND ?', (start, end))
+            found.update((fingerprint(*row[1:]), row[0]) for row in c.fetchall())
+    return found
+
+
+def find_duplicate(conn, amount, category_id, day, description):
+    # Id of a transaction (live or archived) with the same fingerprint, or None
+    fp = fingerprint(amount, category_id, day, description)
+    c = conn.execute('SELECT id FROM transactions WHERE fingerprint=? LIMIT 1', (fp,))
+    row = c.fetchone()
+    return row[0] if row else _archived_fingerprints(conn, day, day).get(fp)
+
+
+def split_duplicates(conn, rows):
+    # Splits incoming rows (dicts with FINGERPRINT_FIELDS) into (new rows, duplicate rows). Existing
+    # fingerprints for the batch's days (archive partitions included) are read once into a set, so
+    # each row costs one O(1) lookup; repeats inside the batch are caught by the same set. New rows
+    # get their fingerprint filled in.
+    rows = list(rows)
+    if not rows:
+        return [], []
+    days = [row['day'] for row in rows]
+    c = conn.execute('SELECT fingerprint FROM transactions WHERE day BETWEEN ? AND ?', (min(days), max(days)))
+    seen = {fp for fp, in c.fetchall()}
+    seen.update(_archived_fingerprints(conn, min(days), max(days)))
+    fresh, duplicates = [], []
+    for row in rows:
+        fp = fingerprint(*(row[field] for field in FINGERPRINT_FIELDS))
+        if fp in seen:
+            duplicates.append(row)
+        else:
+            seen.add(fp)
+            fresh.append(dict(row, fingerprint=fp))
+    return fresh, duplicates
+
+
+def duplicate_ids(conn):
+    # Every transaction that repeats an earlier one (lower id) with the same fingerprint, in one query
+    c = conn.execute('''SELECT t.id FROM transactions t
+                        WHERE EXISTS (SELECT 1 FROM transactions d WHERE d.fingerprint = t.fingerprint AND d.id < t.id)''')
+    return [row[0] for row in c.fetchall()]
@@ -0,0 +1,128 @@
+import datetime
+
+from dates import to_day
+from queries import LedgerIndex
+
+# Days past the later of today and the newest transaction that the index covers up front, so
+# entries dated a little ahead don't force a rebuild
+FENWICK_HEADROOM_DAYS = 366
+TRANSACTION_TYPES = ('Income', 'Expense')
+
+
+class FenwickTree:
+    # Binary indexed tree over n slots (0-based): add() and prefix() are O(log n), so is any range sum
+
+    def __init__(self, values):
+        # Built in O(n) from the initial slot values
+        self.n = len(values)
+        self.tree = [0.0] + [float(value) for value in values]
+        for i in range(1, self.n + 1):
+            j = i + (i & -i)
+            if j <= self.n:
+                self.tree[j] += self.tree[i]
+
+    def add(self, index, delta):
+        i = index + 1
+        while i <= self.n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index):
+        # Sum of slots 0..index; 0 for index < 0
+        total = 0.0
+        i = min(index, self.n - 1) + 1
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def range_sum(self, lo, hi):
+        return self.prefix(hi) - self.prefix(lo - 1) if lo <= hi else 0.0
+
+
+class RangeIndex(LedgerIndex):
+    # Daily income/expense totals (overall and per category) in Fenwick trees indexed by day, so
+    # the total of any date range is O(log days) however wide it is. Built once from a grouped
+    # query over the live rows plus archive rollups, then kept current from journal operations.
+
+    def __init__(self):
+        self.first_day = 0
+        self.trees = {}
+        self.category_trees = {}
+        self._stale = True
+
+    def load(self, conn):
+        c = conn.cursor()
+        c.execute('''SELECT day, type, category_id, SUM(amount) FROM (
+                         SELECT day, type, category_id, amount FROM transactions
+                         UNION ALL
+                         SELECT day, type, category_id, total FROM archive_rollups
+                     ) GROUP BY day, type, category_id''')
+        rows = c.fetchall()
+        today = datetime.date.today().toordinal()
+        days = [row[0] for row in rows]
+        self.first_day = min(days + [today])
+        size = max(days + [today]) - self.first_day + 1 + FENWICK_HEADROOM_DAYS
+        by_type = {ttype: [0.0] * size for ttype in TRANSACTION_TYPES}
+        by_category = {}
+        for day, ttype, cat_id, total in rows:
+            slot = day - self.first_day
+            if (ttype, cat_id) not in by_category:
+                by_category[(ttype, cat_id)] = [0.0] * size
+                by_type.setdefault(ttype, [0.0] * size)
+            by_type[ttype][slot] += total
+            by_category[(ttype, cat_id)][slot] += total
+        self.trees = {ttype: FenwickTree(values) for ttype, values in by_type.items()}
+        self.category_trees = {key: FenwickTree(values) for key, values in by_category.items()}
+        self._loaded(conn)
+
+    def apply(self, ops):
+        # Journal listener: move each changed row's amount out of its old day and into its new one
+        for table, rowid, before, after in ops:
+            if table != 'transactions':
+                continue
+            if before is not None:
+                self._add(before, -1)
+            if after is not None:
+                self._add(after, 1)
+
+    def _add(self, row, sign):
+        if self._stale:
+            return
+        slot = row['day'] - self.first_day
+        tree = self.trees.get(row['type'])
+        if tree is None or not 0 <= slot < tree.n:
+            # Outside the indexed days: rebuild with wider bounds on the next read
+            self._stale = True
+            return
+        tree.add(slot, sign * row['amount'])
+        key = (row['type'], row['category_id'])
+        if key not in self.category_trees:
+            self.category_trees[key] = FenwickTree([0.0] * tree.n)
+        self.category_trees[key].add(slot, sign * row['amount'])
+
+    def _slots(self, start, end):
+        lo = 0 if start is None else to_day(start) - self.first_day
+        hi = (1 << 31) if end is None else to_day(end) - self.first_day
+        return max(lo, 0), hi
+
+    def totals(self, start=None, end=None):
+        # {'Income': total, 'Expense': total} for days between start and end (inclusive), or all days
+        self._fresh()
+        lo, hi = self._slots(start, end)
+        totals = {'Income': 0, 'Expense': 0}
+        for ttype, tree in self.trees.items():
+            totals[ttype] = tree.range_sum(lo, hi)
+        return totals
+
+    def category_totals(self, ttype, start=None, end=None):
+        # {category id: total} for one transaction type over the range, leaving out zero totals
+        self._fresh()
+        lo, hi = self._slots(start, end)
+        totals = {}
+        for (tree_type, cat_id), tree in self.category_trees.items():
+            if tree_type == ttype:
+                total = tree.range_sum(lo, hi)
+                if abs(total) > 1e-9:
+                    totals[cat_id] = total
+        return totals
@@ -0,0 +1,65 @@
+import csv
+import math
+
+from dates import to_day
+
+# Expected header of an imported statement; description is optional, and category (or both type
+# and category) may be left blank for the auto-categorization rules to fill in
+CSV_COLUMNS = ('date', 'type', 'category', 'amount', 'description')
+
+
+def read_statement(conn, path, rules=None):
+    # Parses a CSV statement into transaction rows ready for insert. Returns (rows, errors), where
+    # errors holds (line number, message) for rows that were skipped. Raises ValueError when the
+    # file itself can't be used. rules is an optional RuleEngine for rows without a category.
+    c = conn.cursor()
+    c.execute('SELECT name, type, id FROM categories')
+    categories = {}
+    category_types = {}
+    for name, ttype, cid in c.fetchall():
+        categories[(name.lower(), ttype)] = cid
+        category_types[cid] = ttype
+    rows, errors = [], []
+    # Statements repeat the same few hundred dates; parse each distinct one once
+    days = {}
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        try:
+            missing = [col for col in CSV_COLUMNS[:4] if col not in (reader.fieldnames or [])]
+            if missing:
+                raise ValueError(f'missing column(s): {", ".join(missing)}')
+            for record in reader:
+                line = reader.line_num
+                ttype = (record['type'] or '').strip().capitalize()
+                category = (record['category'] or '').strip()
+                description = (record.get('description') or '').strip()
+                if ttype not in ('Income', 'Expense') and (ttype or category):
+                    errors.append((line, 'type must be Income or Expense'))
+                    continue
+                try:
+                    amount = float(record['amount'])
+                    if not math.isfinite(amount):
+                        raise ValueError(record['amount'])
+                    text = (record['date'] or '').strip()
+                    day = days.get(text)
+                    if day is None:
+                        day = days[text] = to_day(text)
+                except (TypeError, ValueError):
+                    errors.append((line, 'invalid amount or date'))
+                    continue
+                if category:
+                    cat_id = categories.get((category.lower(), ttype))
+                    if cat_id is None:
+                        errors.append((line, f'unknown category {category!r}'))
+                        continue
+                else:
+                    cat_id = rules.classify(description, amount, ttype or None) if rules else None
+                    if cat_id is None:
+                        errors.append((line, 'no category given and no rule matched'))
+                        continue
+                    ttype = category_types[cat_id]
+                rows.append({'amount': amount, 'category_id': cat_id, 'day': day,
+                             'description': description, 'type': ttype})
+        except csv.Error as e:
+            raise ValueError(f'line {reader.line_num}: {e}')
+    return rows, errors
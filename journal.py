@@ -0,0 +1,232 @@
+import sqlite3
+from contextlib import contextmanager
+
+from queries import stored_columns
+
+# How many undo groups are kept in memory
+JOURNAL_LIMIT = 200
+
+
+class EditJournal:
+    # Records every row change made through it as a reversible operation so edits can be undone
+    # and redone. Each operation is a (table, rowid, before, after) tuple holding full row dicts;
+    # before is None for inserts and after is None for deletes. Changes made inside one group()
+    # share a single SQLite transaction (nested groups become savepoints) and undo as one step.
+
+    def __init__(self, conn, limit=JOURNAL_LIMIT):
+        self.conn = conn
+        self.limit = limit
+        self.undo_stack = []
+        self.redo_stack = []
+        # Called with the list of applied operations after every commit, undo and redo
+        self.listeners = []
+        # Per-table callables that derive extra columns from a full row (e.g. a hash of other
+        # columns); their result is written alongside every insert and update
+        self.row_hooks = {}
+        # Set while a WriteQueue holds the transaction open: groups then leave the commit to it
+        self.deferred = False
+        self._depth = 0
+        self._pending = None
+        self._columns = {}
+
+    @contextmanager
+    def group(self, label):
+        outer = self._depth == 0
+        if outer:
+            self._pending = []
+        savepoint = f'journal_{self._depth}'
+        mark = len(self._pending)
+        self.conn.execute(f'SAVEPOINT {savepoint}')
+        self._depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._depth -= 1
+            self.conn.execute(f'ROLLBACK TO {savepoint}')
+            self.conn.execute(f'RELEASE {savepoint}')
+            del self._pending[mark:]
+            if outer:
+                self._pending = None
+            raise
+        self._depth -= 1
+        self.conn.execute(f'RELEASE {savepoint}')
+        if outer:
+            ops = self._pending
+            self._pending = None
+            if self.conn.in_transaction and not self.deferred:
+                self.conn.commit()
+            if ops:
+                self.undo_stack.append((label, ops))
+                del self.undo_stack[:-self.limit]
+                self.redo_stack.clear()
+                self._notify(ops)
+
+    def insert(self, table, values, label='Add'):
+        with self.group(label):
+            values = self._with_derived(table, values)
+            cols = list(values)
+            c = self.conn.cursor()
+            c.execute(f'INSERT INTO {table} ({", ".join(cols)}) VALUES ({", ".join("?" * len(cols))})',
+                      [values[col] for col in cols])
+            rowid = c.lastrowid
+            self._pending.append((table, rowid, None, self._fetch(table, rowid)))
+        return rowid
+
+    def update(self, table, rowid, values, label='Edit'):
+        with self.group(label):
+            before = self._fetch(table, rowid)
+            if before is None:
+                return
+            after = self._with_derived(table, dict(before, **values))
+            changed = {col: val for col, val in after.items() if before.get(col) != val}
+            if not changed:
+                return
+            self._write_columns(table, rowid, changed)
+            self._pending.append((table, rowid, before, after))
+
+    def insert_many(self, table, rows, label='Import'):
+        # Bulk insert with one executemany; the new rows are read back in a single range query
+        # (ids only grow inside our write transaction), so the cost stays set-based
+        rows = [self._with_derived(table, row) for row in rows]
+        if not rows:
+            return 0
+        with self.group(label):
+            cols = list(rows[0])
+            c = self.conn.cursor()
+            c.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+            last_id = c.fetchone()[0]
+            c.executemany(f'INSERT INTO {table} ({", ".join(cols)}) VALUES ({", ".join("?" * len(cols))})',
+                          [[row[col] for col in cols] for row in rows])
+            for after in self._fetch_where(table, 'id > ?', (last_id,)):
+                self._pending.append((table, after['id'], None, after))
+        return len(rows)
+
+    def update_many(self, table, changes, label='Edit'):
+        # changes: {rowid: {column: value}}. The old rows are read in one query and the new values
+        # written from a temp table with one UPDATE ... FROM, so the cost stays set-based
+        with self.group(label):
+            self._load_ids(changes)
+            ops = []
+            for before in self._fetch_where(table, 'id IN (SELECT id FROM temp.journal_ids)'):
+                after = self._with_derived(table, dict(before, **changes[before['id']]))
+                if after != before:
+                    ops.append((table, before['id'], before, after))
+            if not ops:
+                return 0
+            cols = sorted({col for _, _, before, after in ops for col in after if after[col] != before[col]})
+            self.conn.execute('DROP TABLE IF EXISTS temp.journal_updates')
+            self.conn.execute(f'CREATE TEMP TABLE journal_updates (id INTEGER PRIMARY KEY, {", ".join(cols)})')
+            self.conn.executemany(
+                f'INSERT INTO temp.journal_updates (id, {", ".join(cols)}) VALUES (?{", ?" * len(cols)})',
+                [[rowid] + [after[col] for col in cols] for _, rowid, _, after in ops])
+            self.conn.execute(f'''UPDATE {table} SET {", ".join(f"{col} = u.{col}" for col in cols)}
+                                  FROM temp.journal_updates u WHERE {table}.id = u.id''')
+            self.conn.execute('DROP TABLE temp.journal_updates')
+            self._pending.extend(ops)
+        return len(ops)
+
+    def delete(self, table, rowid, label='Delete'):
+        with self.group(label):
+            before = self._fetch(table, rowid)
+            if before is None:
+                return
+            self.conn.execute(f'DELETE FROM {table} WHERE rowid=?', (rowid,))
+            self._pending.append((table, rowid, before, None))
+
+    def delete_many(self, table, rowids, label='Delete'):
+        # Snapshots and deletes the rows through a temp table of ids: one SELECT and one DELETE
+        with self.group(label):
+            self._load_ids(rowids)
+            where = 'id IN (SELECT id FROM temp.journal_ids)'
+            rows = self._fetch_where(table, where)
+            self.conn.execute(f'DELETE FROM {table} WHERE {where}')
+            self._pending.extend((table, before['id'], before, None) for before in rows)
+        return len(rows)
+
+    def can_undo(self):
+        return bool(self.undo_stack) and self._depth == 0
+
+    def can_redo(self):
+        return bool(self.redo_stack) and self._depth == 0
+
+    def undo(self):
+        if not self.can_undo():
+            return None
+        label, ops = self.undo_stack.pop()
+        applied = [(table, rowid, after, before) for table, rowid, before, after in reversed(ops)]
+        try:
+            self._replay(applied)
+        except sqlite3.Error:
+            self.undo_stack.append((label, ops))
+            raise
+        self.redo_stack.append((label, ops))
+        return label
+
+    def redo(self):
+        if not self.can_redo():
+            return None
+        label, ops = self.redo_stack.pop()
+        try:
+            self._replay(ops)
+        except sqlite3.Error:
+            self.redo_stack.append((label, ops))
+            raise
+        self.undo_stack.append((label, ops))
+        return label
+
+    def _replay(self, ops):
+        self.conn.execute('SAVEPOINT journal_replay')
+        try:
+            for table, rowid, before, after in ops:
+                if after is None:
+                    self.conn.execute(f'DELETE FROM {table} WHERE rowid=?', (rowid,))
+                elif before is None:
+                    cols = list(after)
+                    self.conn.execute(
+                        f'INSERT INTO {table} ({", ".join(cols)}) VALUES ({", ".join("?" * len(cols))})',
+                        [after[col] for col in cols])
+                else:
+                    changed = {col: val for col, val in after.items() if before.get(col) != val}
+                    if changed:
+                        self._write_columns(table, rowid, changed)
+        except sqlite3.Error:
+            self.conn.execute('ROLLBACK TO journal_replay')
+            self.conn.execute('RELEASE journal_replay')
+            raise
+        self.conn.execute('RELEASE journal_replay')
+        if self.conn.in_transaction and not self.deferred:
+            self.conn.commit()
+        self._notify(ops)
+
+    def _write_columns(self, table, rowid, values):
+        cols = list(values)
+        self.conn.execute(f'UPDATE {table} SET {", ".join(f"{col}=?" for col in cols)} WHERE rowid=?',
+                          [values[col] for col in cols] + [rowid])
+
+    def _with_derived(self, table, row):
+        hook = self.row_hooks.get(table)
+        return dict(row, **hook(row)) if hook else row
+
+    def _load_ids(self, rowids):
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS journal_ids (id INTEGER PRIMARY KEY)')
+        self.conn.execute('DELETE FROM temp.journal_ids')
+        self.conn.executemany('INSERT OR IGNORE INTO temp.journal_ids (id) VALUES (?)', ((i,) for i in rowids))
+
+    def _stored_columns(self, table):
+        if table not in self._columns:
+            self._columns[table] = stored_columns(self.conn, table)
+        return self._columns[table]
+
+    def _fetch(self, table, rowid):
+        # By rowid rather than id, so tables keyed on another INTEGER PRIMARY KEY (budgets) work too
+        rows = self._fetch_where(table, 'rowid=?', (rowid,))
+        return rows[0] if rows else None
+
+    def _fetch_where(self, table, where, params=()):
+        cols = self._stored_columns(table)
+        c = self.conn.execute(f'SELECT {", ".join(cols)} FROM {table} WHERE {where}', params)
+        return [dict(zip(cols, row)) for row in c.fetchall()]
+
+    def _notify(self, ops):
+        for listener in self.listeners:
+            listener(ops)
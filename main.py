@@ -1,10 +1,30 @@
 import sqlite3
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from tkinter import ttk, messagebox, simpledialog, filedialog
 from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import os
+import sys
+import time
+import calendar
+import math
+
+from journal import EditJournal
+from write_queue import WriteQueue
+from queries import DerivedCache, stored_columns
+import archive
+from budgets import BudgetEngine
+from fenwick import RangeIndex
+from dates import to_day, ym_of
+import backup
+import maintenance
+import analytics
+import balances
+import sync
+import dedupe
+import importer
+from rules import RuleEngine, RULE_KINDS
 
 # Date picker support
 try:
@@ -16,28 +36,84 @@ except ImportError:
 
 DB_FILE = 'finance_tracker.db'
 CURRENCIES = ['USD', 'EUR', 'INR', 'GBP', 'JPY']
+# Rows inserted into a Treeview per after() callback while streaming a large ledger
+TREE_CHUNK_SIZE = 500
+# Online backups: first one shortly after startup, then on a fixed interval
+BACKUP_FIRST_DELAY_MS = 5 * 60 * 1000
+BACKUP_INTERVAL_MS = 60 * 60 * 1000
+# Database maintenance (see maintenance.py): how often to look for an idle stretch, how long
+# without input counts as idle, and the least time between two completed runs
+MAINTENANCE_CHECK_MS = 30 * 1000
+MAINTENANCE_IDLE_SECONDS = 60
+MAINTENANCE_INTERVAL_SECONDS = 6 * 60 * 60
+
+
+# Tables whose date column used to hold 'YYYY-MM-DD' text: table -> (old column, new day-ordinal column)
+TEXT_DATE_COLUMNS = {
+    'transactions': ('date', 'day'),
+    'subscriptions': ('next_due', 'next_due'),
+    'archive_rollups': ('day', 'day'),
+}
 
 
 # --- DATABASE SETUP ---
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
+def rename_text_date_tables(c):
+    # Databases from before dates became day ordinals: move the old tables aside so the CREATE
+    # statements below build the new shape; copy_text_date_tables() then moves the rows over.
+    legacy = []
+    for table, (old_col, _) in TEXT_DATE_COLUMNS.items():
+        cols = {row[1]: row[2] for row in c.execute(f'PRAGMA table_info({table})').fetchall()}
+        if cols.get(old_col, '').upper() == 'TEXT':
+            c.execute(f'ALTER TABLE {table} RENAME TO {table}_text_dates')
+            legacy.append(table)
+    if legacy:
+        c.execute('DROP VIEW IF EXISTS transactions_view')
+        c.execute('DROP INDEX IF EXISTS idx_transactions_date')
+    return legacy
+
+
+def copy_text_date_tables(c, legacy):
+    for table in legacy:
+        old_col, new_col = TEXT_DATE_COLUMNS[table]
+        old_cols = [row[1] for row in c.execute(f'PRAGMA table_info({table}_text_dates)').fetchall()]
+        new_cols = stored_columns(c, table)
+        cols = [col for col in old_cols if col != old_col and col in new_cols]
+        c.execute(f'''INSERT INTO {table} ({", ".join(cols + [new_col])})
+                      SELECT {", ".join(cols)}, CAST(julianday({old_col}) - 1721424.5 AS INTEGER)
+                      FROM {table}_text_dates''')
+        c.execute(f'DROP TABLE {table}_text_dates')
+        print(f"Converted {table}.{old_col} to day ordinals")
+
+
+def init_db(db_file=None):
+    conn = sqlite3.connect(db_file or DB_FILE)
     c = conn.cursor()
+    # New files free pages in small steps during idle maintenance; only takes effect before the
+    # first table exists (older files switch over with Compact Database)
+    c.execute('PRAGMA auto_vacuum=INCREMENTAL')
+    # WAL lets readers (API server, background jobs) run alongside the writer; the mode is persistent
+    c.execute('PRAGMA journal_mode=WAL')
+    legacy = rename_text_date_tables(c)
     # Categories
     c.execute('''CREATE TABLE IF NOT EXISTS categories (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         name TEXT UNIQUE NOT NULL,
         type TEXT NOT NULL
     )''')
-    # Transactions
+    # Transactions: day is a date ordinal (see dates.py), ym its year-month number (e.g. 202610)
     c.execute('''CREATE TABLE IF NOT EXISTS transactions (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         amount REAL NOT NULL,
         category_id INTEGER NOT NULL,
-        date TEXT NOT NULL,
+        day INTEGER NOT NULL,
         description TEXT,
         type TEXT NOT NULL,
+        ym INTEGER GENERATED ALWAYS AS (CAST(strftime('%Y%m', day + 1721424.5) AS INTEGER)) STORED,
         FOREIGN KEY (category_id) REFERENCES categories(id)
     )''')
+    # Duplicate-detection hash of amount/category/day/description (see dedupe.py)
+    if 'fingerprint' not in [row[1] for row in c.execute('PRAGMA table_xinfo(transactions)').fetchall()]:
+        c.execute('ALTER TABLE transactions ADD COLUMN fingerprint INTEGER')
     # Subscriptions
     c.execute('''CREATE TABLE IF NOT EXISTS subscriptions (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -46,7 +122,60 @@ def init_db():
         category_id INTEGER NOT NULL,
         type TEXT NOT NULL,
         frequency TEXT NOT NULL,
-        next_due TEXT NOT NULL,
+        next_due INTEGER NOT NULL,
+        FOREIGN KEY (category_id) REFERENCES categories(id)
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_transactions_day ON transactions (day)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_transactions_fingerprint ON transactions (fingerprint)')
+    # Old text shape of the ledger, for display
+    c.execute('''CREATE VIEW IF NOT EXISTS transactions_view AS
+        SELECT id, amount, category_id, date(day + 1721424.5) AS date, description, type, day, ym
+        FROM transactions''')
+    # Archived years: rows live in per-year files, per-day rollups stay here for totals and charts
+    c.execute('''CREATE TABLE IF NOT EXISTS archived_years (
+        year INTEGER PRIMARY KEY,
+        path TEXT NOT NULL,
+        row_count INTEGER NOT NULL,
+        archived_at TEXT NOT NULL
+    )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS archive_rollups (
+        day INTEGER NOT NULL,
+        type TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        total REAL NOT NULL,
+        n INTEGER NOT NULL,
+        ym INTEGER GENERATED ALWAYS AS (CAST(strftime('%Y%m', day + 1721424.5) AS INTEGER)) STORED,
+        PRIMARY KEY (day, type, category_id)
+    )''')
+    # Running balance per day, kept by triggers (see balances.py)
+    new_balances = not c.execute("SELECT 1 FROM sqlite_master WHERE name='daily_balance'").fetchone()
+    c.execute('''CREATE TABLE IF NOT EXISTS daily_balance (
+        day INTEGER PRIMARY KEY,
+        net REAL NOT NULL,
+        balance REAL NOT NULL
+    )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS balance_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        dirty_from INTEGER
+    )''')
+    c.execute('INSERT OR IGNORE INTO balance_state (id, dirty_from) VALUES (1, NULL)')
+    for trigger in balances.BALANCE_TRIGGERS:
+        c.execute(trigger)
+    # Per-category monthly budgets
+    c.execute('''CREATE TABLE IF NOT EXISTS budgets (
+        category_id INTEGER PRIMARY KEY,
+        monthly_limit REAL NOT NULL,
+        FOREIGN KEY (category_id) REFERENCES categories(id)
+    )''')
+    # Auto-categorization rules (see rules.py); amount bounds are optional
+    c.execute('''CREATE TABLE IF NOT EXISTS category_rules (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        pattern TEXT NOT NULL,
+        category_id INTEGER NOT NULL,
+        min_amount REAL,
+        max_amount REAL,
+        priority INTEGER NOT NULL DEFAULT 0,
         FOREIGN KEY (category_id) REFERENCES categories(id)
     )''')
     # Settings (for currency)
@@ -54,6 +183,9 @@ def init_db():
         key TEXT PRIMARY KEY,
         value TEXT
     )''')
+    copy_text_date_tables(c, legacy)
+    # Change tracking for `main.py sync` (see sync.py); before seeding, so defaults get stable uids
+    sync.prepare(c)
     # Default categories
     c.execute("INSERT OR IGNORE INTO categories (name, type) VALUES ('Salary', 'Income')")
     c.execute("INSERT OR IGNORE INTO categories (name, type) VALUES ('Investment', 'Income')")
@@ -91,6 +223,11 @@ def init_db():
     # Default currency
     c.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('currency', 'USD')")
     conn.commit()
+    if new_balances:
+        balances.rebuild(conn)
+    backfilled = dedupe.backfill_fingerprints(conn)
+    if backfilled:
+        print(f"Fingerprinted {backfilled} transactions")
 
     # Debug: Check categories were inserted
     c.execute("SELECT COUNT(*) FROM categories")
@@ -122,23 +259,72 @@ def set_currency(curr):
 from tkinter import font as tkfont
 
 
+def pct_change(value, base):
+    change = (value - base) / base * 100
+    return f'{"▲" if change >= 0 else "▼"}{abs(change):.1f}%'
+
+
 class FinanceTrackerApp(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title('Finance Tracker')
         self.geometry('1000x700')
         self.conn = sqlite3.connect(DB_FILE)
+        # Derived totals/series are memoized until the next write
+        self.cache = DerivedCache(self.conn)
         self.currency = get_currency()
+        # Pending after() ids of chunked Treeview loads, keyed by widget path
+        self._tree_load_jobs = {}
+        # Every edit goes through the journal so it can be undone and applied incrementally
+        self.journal = EditJournal(self.conn)
+        self.journal.row_hooks['transactions'] = dedupe.row_fingerprint
+        # Data entry and inline edits commit in groups (one fsync per window, see write_queue.py)
+        self.writes = WriteQueue(self.journal, self.after)
+        # Budgets must see a change before the dashboard redraws
+        self.budgets = BudgetEngine()
+        self.budgets.load(self.conn)
+        self.journal.listeners.append(self.budgets.apply)
+        # Income/expense totals for any dashboard range without rescanning the ledger (see fenwick.py)
+        self.range_index = RangeIndex()
+        self.range_index.load(self.conn)
+        self.journal.listeners.append(self.range_index.apply)
+        self.rules = RuleEngine()
+        self.rules.load(self.conn)
+        self.journal.listeners.append(self.on_journal_change)
+        self.backups = backup.BackupScheduler(DB_FILE)
+        self.maintenance = maintenance.MaintenanceScheduler(DB_FILE)
+        self._last_input = time.monotonic()
+        self._last_maintenance = None
+        # Only runs started on idle give way to the user; Run Now / Compact run to the end
+        self._maintenance_on_idle = False
+        self._compact_win = None
         self.style = ttk.Style(self)
         self.configure_styles()
         import matplotlib
         matplotlib.use('TkAgg')
         self.create_widgets()
+        # The database now persists between runs, so pick up a previously saved goal
+        self.load_savings_goal()
         # Important: Make sure to refresh categories after creating widgets
         self.refresh_all()
+        self.bind('<Control-z>', self.undo_edit)
+        self.bind('<Control-y>', self.redo_edit)
+        self.after(BACKUP_FIRST_DELAY_MS, self.scheduled_backup)
+        self.bind_all('<KeyPress>', self.note_user_input, add='+')
+        self.bind_all('<ButtonPress>', self.note_user_input, add='+')
+        self.after(MAINTENANCE_CHECK_MS, self.scheduled_maintenance)
         self.protocol('WM_DELETE_WINDOW', self.on_close)
 
     def on_close(self):
+        for job in list(self._tree_load_jobs.values()):
+            self.after_cancel(job)
+        self._tree_load_jobs.clear()
+        # Queued writes must reach the disk before the window goes away
+        self.writes.flush()
+        # Let a snapshot in progress finish rather than leave a partial file behind
+        self.backups.wait(timeout=10)
+        self.maintenance.interrupt()
+        self.maintenance.wait(timeout=10)
         try:
             if hasattr(self, 'conn') and self.conn:
                 self.conn.close()
@@ -251,17 +437,30 @@ class FinanceTrackerApp(tk.Tk):
         self.dash_goal_progress.pack(side='left', padx=15)
         self.dash_goal_status = ttk.Label(self.dash_goal_frame, text='', font=('Segoe UI', 10, 'bold'))
         self.dash_goal_status.pack(side='left', padx=5)
+        # Budget alerts
+        self.dash_budget_frame = ttk.LabelFrame(self.tab_dashboard, text='🚦 Budgets (This Month)',
+                                                style='Card.TLabelframe')
+        self.dash_budget_frame.pack(fill='x', padx=20, pady=(0, 10))
+        self.dash_budget_label = ttk.Label(self.dash_budget_frame, text='', font=('Segoe UI', 10, 'bold'))
+        self.dash_budget_label.pack(padx=10, pady=5)
         # Net Worth Card
         self.dash_networth_frame = ttk.LabelFrame(self.tab_dashboard, text='💼 Net Worth', style='Card.TLabelframe')
         self.dash_networth_frame.pack(fill='x', padx=20, pady=(0, 10))
         self.dash_networth_label = ttk.Label(self.dash_networth_frame, text='', font=('Segoe UI', 14, 'bold'),
                                              foreground='#0078d7')
-        self.dash_networth_label.pack(padx=10, pady=5)
+        self.dash_networth_label.pack(side='left', padx=10, pady=5)
+        self.dash_networth_change = ttk.Label(self.dash_networth_frame, text='', font=('Segoe UI', 10))
+        self.dash_networth_change.pack(side='left', padx=5)
+        self.dash_networth_chart_frame = ttk.Frame(self.dash_networth_frame)
+        self.dash_networth_chart_frame.pack(side='left', fill='x', expand=True, padx=5)
+        self.dash_networth_canvas = None
+        self.dash_networth_data = None
         # Trends & Insights
         self.dash_trends_frame = ttk.LabelFrame(self.tab_dashboard, text='📊 Trends & Insights',
                                                 style='Card.TLabelframe')
         self.dash_trends_frame.pack(fill='x', padx=20, pady=(0, 10))
-        self.dash_trends_label = ttk.Label(self.dash_trends_frame, text='', font=('Segoe UI', 10, 'italic'))
+        self.dash_trends_label = ttk.Label(self.dash_trends_frame, text='', font=('Segoe UI', 10, 'italic'),
+                                           justify='left', wraplength=900)
         self.dash_trends_label.pack(padx=10, pady=5)
         # Quick Add Buttons
         dash_btn_frame = ttk.Frame(self.tab_dashboard)
@@ -291,6 +490,7 @@ class FinanceTrackerApp(tk.Tk):
         right_chart_frame.grid(row=0, column=1, sticky='nsew', padx=(10, 0), pady=0)
         self.dash_chart_frame = right_chart_frame  # Store dashboard chart frame for live updates
         self.dash_recent_chart_canvas = None
+        self.dash_recent_chart_data = None
         self.draw_recent_3mo_chart(right_chart_frame)
 
         # Transactions Tab
@@ -319,6 +519,9 @@ class FinanceTrackerApp(tk.Tk):
         ttk.Label(frm_add, text='Category:').pack(anchor='w', padx=5, pady=(8, 2))
         self.cmb_category = ttk.Combobox(frm_add, values=[], state='readonly', width=20)
         self.cmb_category.pack(fill='x', padx=5, pady=2)
+        # A hand-picked category is never overridden by a rule suggestion (reset after each add)
+        self._category_picked = False
+        self.cmb_category.bind('<<ComboboxSelected>>', lambda e: setattr(self, '_category_picked', True))
         # Amount
         ttk.Label(frm_add, text='Amount:').pack(anchor='w', padx=5, pady=(8, 2))
         self.ent_amount = ttk.Entry(frm_add)
@@ -336,6 +539,8 @@ class FinanceTrackerApp(tk.Tk):
         ttk.Label(frm_add, text='Description:').pack(anchor='w', padx=5, pady=(8, 2))
         self.ent_desc = ttk.Entry(frm_add)
         self.ent_desc.pack(fill='x', padx=5, pady=2)
+        self.ent_desc.bind('<FocusOut>', self.suggest_category)
+        self.ent_desc.bind('<Return>', self.suggest_category)
         # Add Button
         ttk.Button(frm_add, text='Add', style='Accent.TButton', command=self.add_transaction).pack(pady=10)
 
@@ -344,6 +549,7 @@ class FinanceTrackerApp(tk.Tk):
         self.trx_chart_frame.grid(row=0, column=1, sticky='nsew', padx=(0, 0), pady=0)
         self.trx_pie_canvas = None
         self.trx_bar_canvas = None
+        self.trx_chart_data = None
         # Draw charts in the right frame
         self.draw_trx_charts()
 
@@ -356,18 +562,34 @@ class FinanceTrackerApp(tk.Tk):
         self.lbl_trx_expense.pack(side='left', padx=10)
         self.lbl_trx_balance = ttk.Label(summary_frame, text='Balance:')
         self.lbl_trx_balance.pack(side='left', padx=10)
+        self.btn_redo = ttk.Button(summary_frame, text='↷ Redo', command=self.redo_edit, state='disabled')
+        self.btn_redo.pack(side='right', padx=5)
+        self.btn_undo = ttk.Button(summary_frame, text='↶ Undo', command=self.undo_edit, state='disabled')
+        self.btn_undo.pack(side='right', padx=5)
+        # Bulk actions on the rows selected in the list below (Ctrl/Shift-click to select several)
+        ttk.Button(summary_frame, text='Delete Selected', command=self.delete_selected_transactions).pack(
+            side='right', padx=5)
+        ttk.Button(summary_frame, text='Recategorize Selected...', command=self.recategorize_selected).pack(
+            side='right', padx=5)
 
         # Transactions Treeview (below)
         tree_frame = ttk.Frame(self.tab_transactions)
         tree_frame.pack(fill='both', expand=True, pady=10)
+        # Loading indicator, only packed while rows are streaming in
+        self.trx_load_frame = ttk.Frame(tree_frame)
+        self.trx_load_label = ttk.Label(self.trx_load_frame, text='')
+        self.trx_load_label.pack(side='left', padx=10)
+        self.trx_load_progress = ttk.Progressbar(self.trx_load_frame, length=200, mode='determinate')
+        self.trx_load_progress.pack(side='left', padx=5)
         columns = ('#', 'Type', 'Category', 'Amount', 'Date', 'Description')
-        self.tree = ttk.Treeview(tree_frame, columns=columns, show='headings', height=15)
+        self.tree = ttk.Treeview(tree_frame, columns=columns, show='headings', height=15, selectmode='extended')
         for col in columns:
             self.tree.heading(col, text=col)
             self.tree.column(col, width=100)
         self.tree.pack(fill='both', expand=True)
         # Bind double-click to inline edit
         self.tree.bind('<Double-1>', self.edit_transaction)
+        self.tree.bind('<Delete>', self.delete_selected_transactions)
 
         # Settings Tab
         self.tab_settings = ttk.Frame(self.tabs)
@@ -391,8 +613,9 @@ class FinanceTrackerApp(tk.Tk):
         # --- Category Management ---
         cat_frame = ttk.LabelFrame(settings_frame, text='Manage Categories')
         cat_frame.pack(fill='both', expand=True, pady=10)
-        self.settings_cat_tree = ttk.Treeview(cat_frame, columns=('id', 'name', 'type'), show='headings', height=8)
-        for col in ['id', 'name', 'type']:
+        self.settings_cat_tree = ttk.Treeview(cat_frame, columns=('id', 'name', 'type', 'budget'), show='headings',
+                                              height=8)
+        for col in ['id', 'name', 'type', 'budget']:
             self.settings_cat_tree.heading(col, text=col.capitalize())
             self.settings_cat_tree.column(col, width=100)
         self.settings_cat_tree.pack(fill='both', expand=True, pady=5)
@@ -403,6 +626,72 @@ class FinanceTrackerApp(tk.Tk):
                                                                                                             padx=5)
         ttk.Button(btns_frame, text='Delete', style='Accent.TButton', command=self.settings_delete_category).pack(
             side='left', padx=5)
+        ttk.Button(btns_frame, text='Set Budget', style='Accent.TButton', command=self.settings_set_budget).pack(
+            side='left', padx=5)
+
+        # --- Auto-Categorization Rules ---
+        rules_frame = ttk.LabelFrame(settings_frame, text='Auto-Categorization Rules')
+        rules_frame.pack(fill='x', pady=10)
+        self.settings_rules_tree = ttk.Treeview(rules_frame, columns=('id', 'priority', 'kind', 'pattern', 'category',
+                                                                      'amount'), show='headings', height=4)
+        for col in ['id', 'priority', 'kind', 'pattern', 'category', 'amount']:
+            self.settings_rules_tree.heading(col, text=col.capitalize())
+            self.settings_rules_tree.column(col, width=60 if col in ('id', 'priority', 'kind') else 140)
+        self.settings_rules_tree.pack(fill='x', pady=5)
+        rule_btns = ttk.Frame(rules_frame)
+        rule_btns.pack(pady=5)
+        ttk.Button(rule_btns, text='Add Rule', style='Accent.TButton', command=self.settings_add_rule).pack(side='left',
+                                                                                                           padx=5)
+        ttk.Button(rule_btns, text='Delete Rule', style='Accent.TButton', command=self.settings_delete_rule).pack(
+            side='left', padx=5)
+        ttk.Button(rule_btns, text='Apply to Existing', style='Accent.TButton',
+                   command=self.settings_apply_rules).pack(side='left', padx=5)
+        self.settings_refresh_rules()
+
+        # --- Yearly Archive ---
+        archive_frame = ttk.LabelFrame(settings_frame, text='Archive')
+        archive_frame.pack(fill='x', pady=10)
+        ttk.Label(archive_frame, text='Closed year:').pack(side='left', padx=10, pady=10)
+        self.settings_archive_year = ttk.Combobox(archive_frame, values=[], state='readonly', width=8)
+        self.settings_archive_year.pack(side='left', padx=5)
+        ttk.Button(archive_frame, text='Archive Year', style='Accent.TButton',
+                   command=self.settings_archive_year_action).pack(side='left', padx=10)
+        self.settings_archive_status = ttk.Label(archive_frame, text='')
+        self.settings_archive_status.pack(side='left', padx=10)
+
+        # --- Backups ---
+        backup_frame = ttk.LabelFrame(settings_frame, text='Backups')
+        backup_frame.pack(fill='x', pady=10)
+        ttk.Button(backup_frame, text='Back Up Now', style='Accent.TButton',
+                   command=self.start_backup).pack(side='left', padx=10, pady=10)
+        self.settings_snapshot_combo = ttk.Combobox(backup_frame, values=[], state='readonly', width=36)
+        self.settings_snapshot_combo.pack(side='left', padx=5)
+        ttk.Button(backup_frame, text='Restore', style='Accent.TButton',
+                   command=self.settings_restore_backup).pack(side='left', padx=5)
+        self.settings_backup_status = ttk.Label(backup_frame, text='No backup yet this session.')
+        self.settings_backup_status.pack(side='left', padx=10)
+        self.settings_refresh_snapshots()
+
+        # --- Database Maintenance ---
+        maintenance_frame = ttk.LabelFrame(settings_frame, text='Database Maintenance')
+        maintenance_frame.pack(fill='x', pady=10)
+        ttk.Button(maintenance_frame, text='Run Now', style='Accent.TButton',
+                   command=self.start_maintenance).pack(side='left', padx=10, pady=10)
+        ttk.Button(maintenance_frame, text='Compact Database', style='Accent.TButton',
+                   command=self.settings_compact_database).pack(side='left', padx=5)
+        self.settings_maintenance_status = ttk.Label(maintenance_frame,
+                                                     text='Runs automatically while the app is idle.')
+        self.settings_maintenance_status.pack(side='left', padx=10)
+
+        # --- Import & Duplicates ---
+        data_frame = ttk.LabelFrame(settings_frame, text='Import & Duplicates')
+        data_frame.pack(fill='x', pady=10)
+        ttk.Button(data_frame, text='Import CSV...', style='Accent.TButton',
+                   command=self.settings_import_csv).pack(side='left', padx=10, pady=10)
+        ttk.Button(data_frame, text='Remove Duplicates', style='Accent.TButton',
+                   command=self.settings_remove_duplicates).pack(side='left', padx=5)
+        self.settings_data_status = ttk.Label(data_frame, text='CSV columns: date, type, category, amount, description')
+        self.settings_data_status.pack(side='left', padx=10)
 
         # IMPORTANT: Call refresh_categories after UI is set up
         self.refresh_categories()
@@ -414,7 +703,7 @@ class FinanceTrackerApp(tk.Tk):
         if not sel:
             return
         item = self.settings_cat_tree.item(sel[0])['values']
-        cid, name, ttype = item
+        cid, name, ttype = item[:3]
         col = self.settings_cat_tree.identify_column(event.x)
         col_index = int(col.replace('#', '')) - 1
 
@@ -436,13 +725,8 @@ class FinanceTrackerApp(tk.Tk):
                 if not new_name:
                     return
                 try:
-                    c = self.conn.cursor()
-                    c.execute('UPDATE categories SET name=? WHERE id=?', (new_name, cid))
-                    self.conn.commit()
-                    vals = list(self.settings_cat_tree.item(sel[0])['values'])
-                    vals[1] = new_name
-                    self.settings_cat_tree.item(sel[0], values=vals)
-                    self.refresh_all()
+                    self.writes.submit(self.journal.update, 'categories', cid, {'name': new_name},
+                                       label='Rename category')
                 except sqlite3.IntegrityError:
                     messagebox.showerror('Error', 'Category already exists.')
 
@@ -460,13 +744,8 @@ class FinanceTrackerApp(tk.Tk):
                 cb.destroy()
                 if new_type not in ['Income', 'Expense']:
                     return
-                c = self.conn.cursor()
-                c.execute('UPDATE categories SET type=? WHERE id=?', (new_type, cid))
-                self.conn.commit()
-                vals = list(self.settings_cat_tree.item(sel[0])['values'])
-                vals[2] = new_type
-                self.settings_cat_tree.item(sel[0], values=vals)
-                self.refresh_all()
+                self.writes.submit(self.journal.update, 'categories', cid, {'type': new_type},
+                                   label='Change category type')
 
             cb.bind('<<ComboboxSelected>>', save_type)
             cb.bind('<FocusOut>', save_type)
@@ -475,19 +754,226 @@ class FinanceTrackerApp(tk.Tk):
     def update_currency_from_settings(self):
         curr = self.settings_currency_var.get()
         if curr and curr in CURRENCIES:
+            # set_currency writes through its own connection, which would wait on the queued batch
+            self.writes.flush()
             set_currency(curr)
             self.currency = curr
             self.refresh_all()
         else:
             messagebox.showerror('Invalid', 'Invalid or unsupported currency.')
 
+    def settings_refresh_archive(self):
+        years = archive.archivable_years(self.conn)
+        self.settings_archive_year['values'] = years
+        self.settings_archive_year.set(years[-1] if years else '')
+        done = archive.archived_years(self.conn)
+        if done:
+            self.settings_archive_status['text'] = 'Archived: ' + ', '.join(
+                f'{year} ({count} rows)' for year, _, count in done)
+        else:
+            self.settings_archive_status['text'] = 'No archived years.'
+
+    def settings_archive_year_action(self):
+        year = self.settings_archive_year.get()
+        if not year:
+            return
+        if not messagebox.askyesno('Archive', f'Move all {year} transactions into their own archive file?\n'
+                                              'Totals and charts keep including them.'):
+            return
+        # archive_year commits whatever transaction is open before it attaches the archive file;
+        # flushing first makes that the queue's own commit, so its pending count and deferred flag
+        # don't outlive the batch
+        self.writes.flush()
+        try:
+            moved = archive.archive_year(self.conn, int(year))
+        except (ValueError, sqlite3.Error) as e:
+            messagebox.showerror('Archive', str(e))
+            return
+        # Journal entries may point at rows that now live in the archive file
+        self.journal.undo_stack.clear()
+        self.journal.redo_stack.clear()
+        self.update_undo_buttons()
+        self.settings_refresh_archive()
+        self.refresh_all()
+        messagebox.showinfo('Archive', f'Archived {moved} transactions from {year}.')
+
+    def scheduled_backup(self):
+        self.start_backup()
+        self.after(BACKUP_INTERVAL_MS, self.scheduled_backup)
+
+    def start_backup(self):
+        # The snapshot reads through its own connection, which only sees committed writes
+        self.writes.flush()
+        if self.backups.start():
+            self.settings_backup_status['text'] = 'Backing up...'
+            self.after(200, self.poll_backup)
+
+    def poll_backup(self):
+        # The snapshot runs on a worker thread; check back until it is done
+        if self.backups.running():
+            self.after(200, self.poll_backup)
+            return
+        status, detail, seconds, size = self.backups.last_result
+        if status == 'ok':
+            self.settings_backup_status['text'] = (f'Last backup: {datetime.now():%Y-%m-%d %H:%M} '
+                                                   f'({size / 1024 / 1024:.1f} MB, {seconds:.1f}s)')
+        else:
+            self.settings_backup_status['text'] = f'Backup failed: {detail}'
+        self.settings_refresh_snapshots()
+
+    def note_user_input(self, event=None):
+        self._last_input = time.monotonic()
+        if self._maintenance_on_idle and self.maintenance.running():
+            self.maintenance.interrupt()
+
+    def scheduled_maintenance(self):
+        self.after(MAINTENANCE_CHECK_MS, self.scheduled_maintenance)
+        now = time.monotonic()
+        if now - self._last_input < MAINTENANCE_IDLE_SECONDS or self.backups.running():
+            return
+        if self._last_maintenance is not None and now - self._last_maintenance < MAINTENANCE_INTERVAL_SECONDS:
+            return
+        self.start_maintenance(on_idle=True)
+
+    def start_maintenance(self, on_idle=False, task=None):
+        # Pending group commits would hold the write lock the vacuum steps need
+        self.writes.flush()
+        if self.maintenance.start(task):
+            self._maintenance_on_idle = on_idle
+            self.settings_maintenance_status['text'] = 'Compacting...' if task == 'compact' else 'Running...'
+            if task == 'compact':
+                self.show_compact_progress()
+            self.after(200, self.poll_maintenance)
+
+    def settings_compact_database(self):
+        if messagebox.askyesno('Compact Database', 'Rewrite the database file to reclaim all free space? '
+                                                   'Editing is paused until it finishes.'):
+            self.start_maintenance(task='compact')
+
+    def show_compact_progress(self):
+        # VACUUM holds the write lock for the whole rewrite, longer than the connection's busy
+        # timeout, so a save in the meantime would freeze the window and then fail. A modal dialog
+        # keeps every editing control out of reach until poll_maintenance sees the rewrite finish.
+        self._compact_win = tk.Toplevel(self)
+        self._compact_win.title('Compact Database')
+        self._compact_win.transient(self)
+        self._compact_win.resizable(False, False)
+        self._compact_win.protocol('WM_DELETE_WINDOW', lambda: None)
+        ttk.Label(self._compact_win, text='Compacting the database file...').pack(padx=20, pady=(15, 5))
+        progress = ttk.Progressbar(self._compact_win, length=240, mode='indeterminate')
+        progress.pack(padx=20, pady=(5, 15))
+        progress.start(15)
+        self._compact_win.grab_set()
+
+    def poll_maintenance(self):
+        # Maintenance runs on a worker thread; check back until it is done
+        if self.maintenance.running():
+            self.after(200, self.poll_maintenance)
+            return
+        if self._compact_win is not None:
+            self._compact_win.grab_release()
+            self._compact_win.destroy()
+            self._compact_win = None
+        result = self.maintenance.last_result
+        stamp = f'{result["finished"]:%Y-%m-%d %H:%M}'
+        if result['error']:
+            self.settings_maintenance_status['text'] = f'Maintenance failed: {result["error"]}'
+        elif result['task'] == 'compact':
+            saved = result['saved_bytes'] / 1024 / 1024
+            self.settings_maintenance_status['text'] = f'Compacted {stamp}: saved {saved:.1f} MB in {result["seconds"]:.1f}s'
+        else:
+            parts = [f'analyzed in {result["analyze_seconds"]:.2f}s']
+            if result['vacuum_seconds'] is not None:
+                reclaimed = result['reclaimed_bytes'] / 1024 / 1024
+                parts.append(f'reclaimed {reclaimed:.1f} MB in {result["vacuum_seconds"]:.2f}s')
+            if not result['incremental'] and result['free_bytes']:
+                parts.append(f'{result["free_bytes"] / 1024 / 1024:.1f} MB free (Compact Database to reclaim)')
+            if result['problems'] is not None:
+                parts.append(f'quick check {"ok" if not result["problems"] else "FAILED"} '
+                             f'in {result["check_seconds"]:.2f}s')
+            if result['interrupted']:
+                parts.append('paused for input, resumes when idle')
+            else:
+                self._last_maintenance = time.monotonic()
+            self.settings_maintenance_status['text'] = f'Last maintenance {stamp}: ' + ', '.join(parts)
+            if result['problems']:
+                messagebox.showwarning('Database Check', 'The integrity check found problems:\n'
+                                       + '\n'.join(result['problems'][:10])
+                                       + '\nRestore a backup from Settings → Backups.')
+
+    def settings_refresh_snapshots(self):
+        self.snapshot_paths = {os.path.basename(path): path for path in backup.list_snapshots(self.backups.backup_dir)}
+        names = list(self.snapshot_paths)
+        self.settings_snapshot_combo['values'] = names
+        self.settings_snapshot_combo.set(names[0] if names else '')
+
+    def settings_restore_backup(self):
+        name = self.settings_snapshot_combo.get()
+        if not name or self.backups.running() or self.maintenance.running():
+            return
+        if not messagebox.askyesno('Restore', f'Replace all current data with the snapshot {name}?'):
+            return
+        self.writes.flush()
+        try:
+            backup.restore_snapshot(self.conn, self.snapshot_paths[name])
+        except (OSError, sqlite3.Error) as e:
+            messagebox.showerror('Restore', f'Restore failed: {e}')
+            return
+        # Bring an older snapshot's schema up to date, then drop every piece of derived state.
+        # The file also takes a new sync identity: peers have already seen its old log positions.
+        init_db()
+        sync.reset_site(self.conn)
+        self.cache.clear()
+        self.journal.undo_stack.clear()
+        self.journal.redo_stack.clear()
+        self.budgets.load(self.conn)
+        self.range_index.load(self.conn)
+        self.rules.load(self.conn)
+        self.settings_refresh_rules()
+        self.currency = get_currency()
+        self.settings_currency_var.set(self.currency)
+        self.load_savings_goal()
+        self.settings_refresh_categories()
+        self.update_undo_buttons()
+        self.refresh_all()
+        messagebox.showinfo('Restore', f'Restored {name}.')
+
+    def settings_import_csv(self):
+        path = filedialog.askopenfilename(title='Import Transactions',
+                                          filetypes=[('CSV files', '*.csv'), ('All files', '*.*')])
+        if not path:
+            return
+        try:
+            rows, errors = importer.read_statement(self.conn, path, self.rules)
+        except (OSError, ValueError) as e:
+            messagebox.showerror('Import', f'Could not read {os.path.basename(path)}: {e}')
+            return
+        fresh, duplicates = dedupe.split_duplicates(self.conn, rows)
+        self.journal.insert_many('transactions', fresh, label='Import')
+        status = f'Imported {len(fresh)}, skipped {len(duplicates)} duplicate(s)'
+        if errors:
+            line, message = errors[0]
+            status += f', {len(errors)} invalid row(s) (line {line}: {message})'
+        self.settings_data_status['text'] = status
+
+    def settings_remove_duplicates(self):
+        ids = dedupe.duplicate_ids(self.conn)
+        if not ids:
+            self.settings_data_status['text'] = 'No duplicate transactions found.'
+            return
+        if not messagebox.askyesno('Remove Duplicates',
+                                   f'Delete {len(ids)} duplicate transaction(s)? The earliest copy of each is kept.'):
+            return
+        self.journal.delete_many('transactions', ids, label='Remove duplicates')
+        self.settings_data_status['text'] = f'Removed {len(ids)} duplicate(s).'
+
     def settings_refresh_categories(self):
-        for row in self.settings_cat_tree.get_children():
-            self.settings_cat_tree.delete(row)
+        self.settings_cat_tree.delete(*self.settings_cat_tree.get_children())
         c = self.conn.cursor()
         c.execute('SELECT id, name, type FROM categories ORDER BY type, name')
         for row in c.fetchall():
-            self.settings_cat_tree.insert('', 'end', values=row)
+            limit = self.budgets.limits.get(row[0])
+            self.settings_cat_tree.insert('', 'end', values=row + (f'{limit:.2f}' if limit is not None else '',))
 
     def settings_add_category(self):
         add_win = tk.Toplevel(self)
@@ -509,31 +995,297 @@ class FinanceTrackerApp(tk.Tk):
                 messagebox.showerror('Invalid', 'Invalid input.')
                 return
             try:
-                c = self.conn.cursor()
-                c.execute('INSERT INTO categories (name, type) VALUES (?, ?)', (name, ttype))
-                self.conn.commit()
+                self.journal.insert('categories', {'name': name, 'type': ttype}, label='Add category')
                 add_win.destroy()
-                self.settings_refresh_categories()
-                self.refresh_categories()
             except sqlite3.IntegrityError:
                 messagebox.showerror('Error', 'Category already exists.')
 
         ttk.Button(add_win, text='Add', style='Accent.TButton', command=do_add).pack(pady=10)
 
+    def settings_refresh_rules(self):
+        if not hasattr(self, 'settings_rules_tree'):
+            return
+        c = self.conn.cursor()
+        c.execute('SELECT id, name, type FROM categories')
+        names = {cid: f'{name} ({ttype})' for cid, name, ttype in c.fetchall()}
+        self.settings_rules_tree.delete(*self.settings_rules_tree.get_children())
+        for rule_id, kind, pattern, cat_id, lo, hi, priority in self.rules.rules:
+            amount = '' if lo is None and hi is None else f'{"" if lo is None else lo}–{"" if hi is None else hi}'
+            self.settings_rules_tree.insert('', 'end', values=(rule_id, priority, kind, pattern,
+                                                               names.get(cat_id, '?'), amount))
+
+    def settings_add_rule(self):
+        add_win = tk.Toplevel(self)
+        add_win.title('Add Rule')
+        add_win.geometry('320x380')
+        c = self.conn.cursor()
+        c.execute('SELECT id, name, type FROM categories ORDER BY type, name')
+        choices = {f'{name} ({ttype})': cid for cid, name, ttype in c.fetchall()}
+        ttk.Label(add_win, text='Description:').pack(pady=(10, 2))
+        kind_var = tk.StringVar(value=RULE_KINDS[0])
+        ttk.Combobox(add_win, textvariable=kind_var, values=RULE_KINDS, state='readonly').pack(pady=2)
+        pattern_var = tk.StringVar()
+        ttk.Entry(add_win, textvariable=pattern_var).pack(pady=2)
+        ttk.Label(add_win, text='Category:').pack(pady=(8, 2))
+        cat_var = tk.StringVar()
+        ttk.Combobox(add_win, textvariable=cat_var, values=list(choices), state='readonly').pack(pady=2)
+        ttk.Label(add_win, text='Amount from / to (optional):').pack(pady=(8, 2))
+        range_frame = ttk.Frame(add_win)
+        range_frame.pack(pady=2)
+        min_var, max_var = tk.StringVar(), tk.StringVar()
+        ttk.Entry(range_frame, textvariable=min_var, width=10).pack(side='left', padx=5)
+        ttk.Entry(range_frame, textvariable=max_var, width=10).pack(side='left', padx=5)
+        ttk.Label(add_win, text='Priority (higher wins):').pack(pady=(8, 2))
+        priority_var = tk.StringVar(value='0')
+        ttk.Spinbox(add_win, textvariable=priority_var, from_=-100, to=100, width=8).pack(pady=2)
+
+        def do_add():
+            try:
+                lo = float(min_var.get()) if min_var.get().strip() else None
+                hi = float(max_var.get()) if max_var.get().strip() else None
+                priority = int(priority_var.get())
+            except ValueError:
+                messagebox.showerror('Invalid', 'Amounts and priority must be numbers.', parent=add_win)
+                return
+            if cat_var.get() not in choices:
+                messagebox.showerror('Invalid', 'Pick a category.', parent=add_win)
+                return
+            self.writes.flush()
+            try:
+                self.rules.add_rule(self.conn, kind_var.get(), pattern_var.get(), choices[cat_var.get()], lo, hi,
+                                    priority)
+            except ValueError as e:
+                messagebox.showerror('Invalid', str(e), parent=add_win)
+                return
+            self.settings_refresh_rules()
+            add_win.destroy()
+
+        ttk.Button(add_win, text='Add', style='Accent.TButton', command=do_add).pack(pady=10)
+
+    def settings_delete_rule(self):
+        sel = self.settings_rules_tree.selection()
+        if not sel:
+            return
+        self.writes.flush()
+        self.rules.delete_rule(self.conn, self.settings_rules_tree.item(sel[0])['values'][0])
+        self.settings_refresh_rules()
+
+    def settings_apply_rules(self):
+        changes = self.rules.recategorize(self.conn)
+        if not changes:
+            messagebox.showinfo('Rules', 'Every matching transaction is already in its rule\'s category.')
+            return
+        if messagebox.askyesno('Rules', f'Recategorize {len(changes)} transaction(s) by the current rules?'):
+            self.journal.update_many('transactions', changes, label='Apply rules')
+
+    def suggest_category(self, event=None):
+        # Add form: fill in the category a rule picks for the description, unless one was chosen by hand
+        if self._category_picked:
+            return
+        try:
+            amount = float(self.ent_amount.get())
+        except ValueError:
+            amount = None
+        cat_id = self.rules.classify(self.ent_desc.get(), amount)
+        if cat_id is None:
+            return
+        c = self.conn.cursor()
+        c.execute('SELECT name, type FROM categories WHERE id=?', (cat_id,))
+        row = c.fetchone()
+        if row is None:
+            return
+        if self.cmb_type.get() != row[1]:
+            self.cmb_type.set(row[1])
+            self.refresh_categories()
+        self.cmb_category.set(row[0])
+
+    def settings_set_budget(self):
+        sel = self.settings_cat_tree.selection()
+        if not sel:
+            return
+        cid, name, ttype = self.settings_cat_tree.item(sel[0])['values'][:3]
+        if ttype != 'Expense':
+            messagebox.showerror('Budget', 'Budgets can only be set on expense categories.')
+            return
+        limit = simpledialog.askfloat('Set Budget', f'Monthly limit for {name} (0 to remove):', parent=self,
+                                      minvalue=0, initialvalue=self.budgets.limits.get(cid, 0))
+        if limit is None:
+            return
+        self.writes.flush()
+        self.budgets.set_limit(self.conn, cid, limit or None)
+        self.settings_refresh_categories()
+        self.refresh_budget_alerts()
+
     def settings_delete_category(self):
         sel = self.settings_cat_tree.selection()
         if not sel:
             return
-        cid = self.settings_cat_tree.item(sel[0])['values'][0]
-        if messagebox.askyesno('Delete', 'Delete this category? Transactions will remain.'):
-            c = self.conn.cursor()
-            c.execute('DELETE FROM categories WHERE id=?', (cid,))
-            self.conn.commit()
-            self.settings_refresh_categories()
+        cid, name, ttype = self.settings_cat_tree.item(sel[0])['values'][:3]
+        c = self.conn.cursor()
+        c.execute('''SELECT (SELECT COUNT(*) FROM transactions WHERE category_id=?),
+                            (SELECT COUNT(*) FROM subscriptions WHERE category_id=?)''', (cid, cid))
+        used, subscribed = c.fetchone()
+        if not used and not subscribed:
+            if messagebox.askyesno('Delete', f'Delete the category {name}?'):
+                with self.journal.group('Delete category'):
+                    self.journal.delete('budgets', cid)
+                    self.journal.delete('categories', cid)
+            return
+
+        def reassign_and_delete(target):
+            # Moving the rows and dropping the category (and its budget, if any; the target keeps
+            # its own limit) is one transaction and one undo step
+            with self.journal.group('Delete category'):
+                for table in ('transactions', 'subscriptions'):
+                    c.execute(f'SELECT id FROM {table} WHERE category_id=?', (cid,))
+                    self.journal.update_many(table, {row[0]: {'category_id': target} for row in c.fetchall()})
+                self.journal.delete('budgets', cid)
+                self.journal.delete('categories', cid)
+
+        self.choose_category('Delete Category', f'{name} is used by {used} transaction(s) and {subscribed} '
+                                                f'subscription(s).\nMove them to:', reassign_and_delete,
+                             ttype=ttype, exclude=cid)
+
+    def choose_category(self, title, prompt, on_pick, ttype=None, exclude=None):
+        # Small dialog listing categories (of one type, if given); calls on_pick(category id) on OK
+        pick_win = tk.Toplevel(self)
+        pick_win.title(title)
+        pick_win.transient(self)
+        c = self.conn.cursor()
+        c.execute('SELECT id, name, type FROM categories WHERE type = COALESCE(?, type) AND id IS NOT ? '
+                  'ORDER BY type, name', (ttype, exclude))
+        choices = {(name if ttype else f'{name} ({cat_type})'): cid for cid, name, cat_type in c.fetchall()}
+        ttk.Label(pick_win, text=prompt, justify='left').pack(padx=15, pady=(12, 4))
+        cat_var = tk.StringVar()
+        ttk.Combobox(pick_win, textvariable=cat_var, values=list(choices), state='readonly').pack(padx=15, pady=4)
+
+        def do_pick():
+            if cat_var.get() not in choices:
+                messagebox.showerror('Invalid', 'Pick a category.', parent=pick_win)
+                return
+            pick_win.destroy()
+            on_pick(choices[cat_var.get()])
+
+        ttk.Button(pick_win, text='OK', style='Accent.TButton', command=do_pick).pack(pady=10)
+
+    def selected_transaction_ids(self):
+        return [self.tree_id_to_dbid[item] for item in self.tree.selection() if item in self.tree_id_to_dbid]
+
+    def recategorize_selected(self):
+        dbids = self.selected_transaction_ids()
+        if not dbids:
+            messagebox.showinfo('Recategorize', 'Select one or more transactions first.')
+            return
+        c = self.conn.cursor()
+        c.execute('SELECT id, type FROM categories')
+        types = dict(c.fetchall())
+
+        def recategorize(cid):
+            # Picking a category of the other type moves the rows to that type as well
+            changes = {dbid: {'category_id': cid, 'type': types[cid]} for dbid in dbids}
+            self.journal.update_many('transactions', changes, label='Recategorize')
+
+        self.choose_category('Recategorize', f'Move {len(dbids)} transaction(s) to:', recategorize)
+
+    def delete_selected_transactions(self, event=None):
+        dbids = self.selected_transaction_ids()
+        if not dbids:
+            return
+        if messagebox.askyesno('Delete', f'Delete {len(dbids)} transaction(s)? This can be undone.'):
+            self.journal.delete_many('transactions', dbids, label='Delete transactions')
+
+    def undo_edit(self, event=None):
+        if isinstance(event.widget if event else None, (tk.Entry, ttk.Entry)):
+            return
+        try:
+            self.journal.undo()
+        except sqlite3.IntegrityError:
+            messagebox.showerror('Undo', 'This change can no longer be undone.')
+        self.update_undo_buttons()
+        return 'break'
+
+    def redo_edit(self, event=None):
+        if isinstance(event.widget if event else None, (tk.Entry, ttk.Entry)):
+            return
+        try:
+            self.journal.redo()
+        except sqlite3.IntegrityError:
+            messagebox.showerror('Redo', 'This change can no longer be redone.')
+        self.update_undo_buttons()
+        return 'break'
+
+    def update_undo_buttons(self):
+        if not hasattr(self, 'btn_undo'):
+            return
+        undo = self.journal.undo_stack[-1][0] if self.journal.can_undo() else None
+        redo = self.journal.redo_stack[-1][0] if self.journal.can_redo() else None
+        self.btn_undo.configure(text=f'↶ Undo {undo}' if undo else '↶ Undo', state='normal' if undo else 'disabled')
+        self.btn_redo.configure(text=f'↷ Redo {redo}' if redo else '↷ Redo', state='normal' if redo else 'disabled')
+
+    def on_journal_change(self, ops):
+        # Incremental update path: only the rows touched by ops are re-read, then the aggregates
+        trx_ids = set()
+        cat_ids = set()
+        for table, rowid, before, after in ops:
+            if table == 'transactions':
+                trx_ids.add(rowid)
+            elif table == 'categories':
+                cat_ids.add(rowid)
+        c = self.conn.cursor()
+        if cat_ids:
+            self.rules.load(self.conn)
             self.refresh_categories()
+            self.settings_refresh_categories()
+            self.settings_refresh_rules()
+            marks = ', '.join('?' * len(cat_ids))
+            c.execute(f'SELECT id FROM transactions WHERE category_id IN ({marks})', list(cat_ids))
+            trx_ids.update(row[0] for row in c.fetchall())
+        if trx_ids:
+            self.refresh_transaction_rows(trx_ids)
+        self.refresh_summaries()
+        self.update_undo_buttons()
+
+    def refresh_transaction_rows(self, dbids):
+        # Re-read only the given transactions and patch their Treeview items in place
+        if not hasattr(self, 'tree'):
+            return
+        if str(self.tree) in self._tree_load_jobs or len(dbids) > TREE_CHUNK_SIZE:
+            # A chunked load is still streaming precomputed rows, or the change is bulk (import,
+            # dedupe); a fresh chunked load keeps the UI responsive either way
+            self.refresh_transactions()
+            return
+        c = self.conn.cursor()
+        dbids = list(dbids)
+        marks = ', '.join('?' * len(dbids))
+        c.execute(
+            f'''SELECT t.id, t.type, c.name, t.amount, t.date, t.description FROM transactions_view t JOIN categories c ON t.category_id=c.id WHERE t.id IN ({marks})''',
+            dbids)
+        found = {row[0]: row for row in c.fetchall()}
+        for dbid in dbids:
+            item_id = self.dbid_to_tree_id.get(dbid)
+            row = found.get(dbid)
+            if row is None:
+                if item_id is not None:
+                    self.tree.delete(item_id)
+                    del self.dbid_to_tree_id[dbid]
+                    del self.tree_id_to_dbid[item_id]
+            elif item_id is not None:
+                idx = self.tree.set(item_id, '#')
+                self.tree.item(item_id, values=(idx,) + row[1:])
+            else:
+                item_id = self.tree.insert('', 0, values=(len(self.tree_id_to_dbid) + 1,) + row[1:])
+                self.tree_id_to_dbid[item_id] = dbid
+                self.dbid_to_tree_id[dbid] = item_id
+
+    def refresh_summaries(self):
+        self.refresh_trx_summary()
+        self.refresh_dashboard()
+        if hasattr(self, 'trx_chart_frame'):
+            self._draw_charts(self.trx_chart_frame, is_dashboard=False)
 
     def refresh_all(self):
         self.refresh_categories()
+        self.settings_refresh_archive()
         self.refresh_overview()
         self.refresh_transactions()
         self.refresh_trx_summary()
@@ -544,12 +1296,9 @@ class FinanceTrackerApp(tk.Tk):
         c = self.conn.cursor()
         start, end = self.get_dashboard_date_range()
         # Income/Expense in range
-        c.execute("SELECT SUM(amount) FROM transactions WHERE type='Income' AND date BETWEEN ? AND ?",
-                  (str(start), str(end)))
-        income = c.fetchone()[0] or 0
-        c.execute("SELECT SUM(amount) FROM transactions WHERE type='Expense' AND date BETWEEN ? AND ?",
-                  (str(start), str(end)))
-        expense = c.fetchone()[0] or 0
+        totals = self.range_index.totals(start, end)
+        income = totals['Income']
+        expense = totals['Expense']
         balance = income - expense
         if hasattr(self, 'dash_income_val'):
             self.dash_income_val['text'] = f'{self.currency} {income:.2f}'
@@ -557,55 +1306,75 @@ class FinanceTrackerApp(tk.Tk):
             self.dash_balance_val['text'] = f'{self.currency} {balance:.2f}'
             savings_rate = self.calculate_savings_rate(income, expense)
             self.dash_savings_val['text'] = f'{savings_rate:.1f}%' if savings_rate is not None else '—'
-        # Net Worth Card
+        # Net Worth Card: the running balance at the end of the range, and how the range moved it
         if hasattr(self, 'dash_networth_label'):
-            networth = income - expense
+            # Re-base pending writes first so the cache keys on the settled data version
+            balances.rebase(self.conn)
+            series = self.cache.get(('balance_series', str(start), str(end)),
+                                    lambda: balances.balance_series(self.conn, start, end))
+            networth = series[-1][1]
             self.dash_networth_label['text'] = f'{self.currency} {networth:.2f}'
+            change = networth - series[0][1]
+            self.dash_networth_change['text'] = f'{"+" if change >= 0 else "−"}{self.currency} {abs(change):.2f} in range'
+            self.draw_networth_chart(series)
         # Savings Goal Progress
         self.update_savings_goal_progress(income)
+        self.refresh_budget_alerts()
         # Recent activity: show last 6 transactions in range
         if hasattr(self, 'dash_recent'):
-            for row in self.dash_recent.get_children():
-                self.dash_recent.delete(row)
-            c.execute(
-                '''SELECT t.type, c.name, t.amount, t.date, t.description FROM transactions t JOIN categories c ON t.category_id=c.id WHERE t.date BETWEEN ? AND ? ORDER BY t.date DESC, t.id DESC LIMIT 6''',
-                (str(start), str(end)))
-            for row in c.fetchall():
+            self.dash_recent.delete(*self.dash_recent.get_children())
+            # Reads archive partitions too when the range reaches into an archived year
+            for row in archive.range_transactions(self.conn, start, end, limit=6):
                 self.dash_recent.insert('', 'end', values=row)
         # Update charts
         if hasattr(self, 'draw_dashboard_charts'):
             self.draw_dashboard_charts()
         # Trends & Insights
-        if hasattr(self, 'dash_trends_label'):
-            # Compare this month vs last month expense
-            import datetime
-            today = datetime.date.today()
-            # This month
-            this_month_start = today.replace(day=1).strftime('%Y-%m-%d')
-            today_str = today.strftime('%Y-%m-%d')
-            c.execute("SELECT SUM(amount) FROM transactions WHERE type='Expense' AND date BETWEEN ? AND ?",
-                      (this_month_start, today_str))
-            this_month_exp = c.fetchone()[0] or 0
-            # Last month
-            first = today.replace(day=1)
-            last_month_end = (first - datetime.timedelta(days=1))
-            last_month_start = last_month_end.replace(day=1)
-            last_month_start_str = last_month_start.strftime('%Y-%m-%d')
-            last_month_end_str = last_month_end.strftime('%Y-%m-%d')
-            c.execute("SELECT SUM(amount) FROM transactions WHERE type='Expense' AND date BETWEEN ? AND ?",
-                      (last_month_start_str, last_month_end_str))
-            last_month_exp = c.fetchone()[0] or 0
-            if last_month_exp > 0:
-                change = ((this_month_exp - last_month_exp) / last_month_exp) * 100
-                if change > 0:
-                    trend = f'Spending increased by {change:.1f}% compared to last month.'
-                elif change < 0:
-                    trend = f'Spending decreased by {abs(change):.1f}% compared to last month.'
-                else:
-                    trend = 'Spending is unchanged compared to last month.'
-            else:
-                trend = 'No spending data for last month.'
-            self.dash_trends_label['text'] = trend
+        self.refresh_trends()
+
+    def refresh_trends(self):
+        # Projection, anomalies and seasonal change for every expense category (see analytics.py)
+        if not hasattr(self, 'dash_trends_label'):
+            return
+        insights = analytics.spending_insights(self.budgets.monthly_spent(), datetime.now().date())
+        if not insights['projections']:
+            self.dash_trends_label['text'] = 'No spending data yet.'
+            return
+        c = self.conn.cursor()
+        c.execute('SELECT id, name FROM categories')
+        names = dict(c.fetchall())
+        lines = [f'Projected spending this month: {self.currency} {insights["projected"]:.2f} '
+                 f'({self.currency} {insights["spent"]:.2f} so far)'
+                 + ''.join(f'; {pct_change(insights["projected"], base)} vs {label}'
+                           for label, base in (('last month', insights['last_month']),
+                                               ('same month last year', insights['last_year'])) if base > 0)]
+        if insights['anomalies']:
+            lines.append('Unusual: ' + ', '.join(
+                f'{names.get(cid, "?")} {abs(z):.1f}σ {"above" if z > 0 else "below"} normal in '
+                f'{calendar.month_abbr[ym % 100]} ({self.currency} {amount:.2f})'
+                for cid, ym, amount, z in insights['anomalies'][:3]))
+        if insights['seasonal']:
+            lines.append('Versus last year: ' + ', '.join(
+                f'{names.get(cid, "?")} {pct_change(projected, last)}'
+                for cid, projected, last in insights['seasonal']))
+        self.dash_trends_label['text'] = '\n'.join(lines)
+
+    def refresh_budget_alerts(self):
+        if not hasattr(self, 'dash_budget_label'):
+            return
+        alerts = self.budgets.alerts(ym_of(datetime.now()))
+        if not self.budgets.limits:
+            self.dash_budget_label.configure(text='No budgets set. Add them under Settings → Manage Categories.',
+                                             foreground='#333')
+            return
+        if not alerts:
+            self.dash_budget_label.configure(text='All categories are within budget.', foreground='#2e7d32')
+            return
+        c = self.conn.cursor()
+        c.execute('SELECT id, name FROM categories')
+        names = dict(c.fetchall())
+        parts = [f'{names.get(cid, "?")}: {self.currency} {spent:.2f} / {limit:.2f}' for cid, spent, limit in alerts]
+        self.dash_budget_label.configure(text='Over budget — ' + ', '.join(parts), foreground='#c62828')
 
     def calculate_savings_rate(self, income, expense):
         try:
@@ -669,6 +1438,7 @@ class FinanceTrackerApp(tk.Tk):
         except Exception:
             messagebox.showerror('Invalid Input', 'Please enter a valid positive number for the goal.')
             return
+        self.writes.flush()
         c = self.conn.cursor()
         c.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('savings_goal', ?)", (str(amt),))
         self.conn.commit()
@@ -702,11 +1472,8 @@ class FinanceTrackerApp(tk.Tk):
             return
         # Use current dashboard income if provided, else recalc
         if income is None:
-            c = self.conn.cursor()
             start, end = self.get_dashboard_date_range()
-            c.execute("SELECT SUM(amount) FROM transactions WHERE type='Income' AND date BETWEEN ? AND ?",
-                      (str(start), str(end)))
-            income = c.fetchone()[0] or 0
+            income = self.range_index.totals(start, end)['Income']
         progress = min(income / self.dash_goal, 1.0) if self.dash_goal > 0 else 0
         self.dash_goal_progress['value'] = progress * 100
         if progress >= 1.0:
@@ -717,16 +1484,35 @@ class FinanceTrackerApp(tk.Tk):
     def draw_dashboard_charts(self):
         # Only show last 3 months spending chart in dashboard
         if hasattr(self, 'dash_chart_frame'):
+            # Nothing to redraw when the data behind the chart is unchanged
+            if self.dash_recent_chart_canvas and self.recent_3mo_data() == self.dash_recent_chart_data:
+                return
             # Remove any previous chart widgets in the frame
             for child in self.dash_chart_frame.winfo_children():
                 child.destroy()
             self.draw_recent_3mo_chart(self.dash_chart_frame)
 
-    def draw_recent_3mo_chart(self, parent):
-        import matplotlib.pyplot as plt
-        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    def draw_networth_chart(self, series):
+        if self.dash_networth_canvas and series == self.dash_networth_data:
+            return
+        self.dash_networth_data = series
+        dates = [datetime.fromordinal(day) for day, _ in series]
+        values = [balance for _, balance in series]
+        fig = plt.Figure(figsize=(6, 1.4), dpi=100)
+        ax = fig.add_subplot(111)
+        ax.step(dates, values, where='post', color='#0078d7')
+        ax.fill_between(dates, values, step='post', alpha=0.15, color='#0078d7')
+        ax.tick_params(labelsize=8)
+        fig.autofmt_xdate()
+        fig.tight_layout()
+        if self.dash_networth_canvas:
+            self.dash_networth_canvas.get_tk_widget().destroy()
+        self.dash_networth_canvas = FigureCanvasTkAgg(fig, master=self.dash_networth_chart_frame)
+        self.dash_networth_canvas.draw()
+        self.dash_networth_canvas.get_tk_widget().pack(fill='x', expand=True)
+
+    def recent_3mo_data(self):
         import calendar, datetime
-        c = self.conn.cursor()
         # Get last 3 months (adaptive)
         today = datetime.date.today()
         months = []
@@ -736,18 +1522,16 @@ class FinanceTrackerApp(tk.Tk):
             y = today.year if today.month - i > 0 else today.year - 1
             months.append((y, m))
             month_labels.append(f'{calendar.month_abbr[m]} {y}')
-        # Query expenses for each month
-        expenses = []
-        for y, m in months:
-            month_start = f'{y}-{m:02d}-01'
-            if m == 12:
-                next_month_start = f'{y + 1}-01-01'
-            else:
-                next_month_start = f'{y}-{m + 1:02d}-01'
-            c.execute("SELECT SUM(amount) FROM transactions WHERE type='Expense' AND date >= ? AND date < ?",
-                      (month_start, next_month_start))
-            amt = c.fetchone()[0] or 0
-            expenses.append(amt)
+        # Expenses for each month, from one grouped query
+        first_y, first_m = months[0]
+        series = self.cache.monthly_series(datetime.date(first_y, first_m, 1))
+        expenses = [series.get((y * 100 + m, 'Expense'), 0) for y, m in months]
+        return month_labels, expenses
+
+    def draw_recent_3mo_chart(self, parent):
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        month_labels, expenses = self.dash_recent_chart_data = self.recent_3mo_data()
         fig = plt.Figure(figsize=(3.8, 2.8), dpi=100)
         ax = fig.add_subplot(111)
         ax.bar(month_labels, expenses, color='#e74c3c')
@@ -768,7 +1552,16 @@ class FinanceTrackerApp(tk.Tk):
     def _draw_charts(self, frame, is_dashboard):
         import matplotlib.pyplot as plt
         from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-        import calendar
+        from dateutil.relativedelta import relativedelta
+        import calendar, datetime
+        if not is_dashboard:
+            data = self.cache.category_breakdown('Expense')
+            since = datetime.date.today() - relativedelta(months=11)
+            series = self.cache.monthly_series(since)
+            # Cache hit with an unchanged result: keep the charts already on screen
+            if self.trx_pie_canvas and (data, series) == self.trx_chart_data:
+                return
+            self.trx_chart_data = (data, series)
         # Remove old charts if present
         if not is_dashboard:
             if hasattr(self, 'trx_pie_canvas') and self.trx_pie_canvas:
@@ -778,14 +1571,6 @@ class FinanceTrackerApp(tk.Tk):
         # Only draw charts for transactions tab (not dashboard)
         if not is_dashboard:
             # Pie chart for expenses by category
-            c = self.conn.cursor()
-            c.execute("""
-                SELECT c.name, SUM(t.amount) FROM transactions t
-                JOIN categories c ON t.category_id = c.id
-                WHERE t.type='Expense'
-                GROUP BY c.name
-            """)
-            data = c.fetchall()
             labels = [row[0] for row in data]
             sizes = [row[1] for row in data]
             pie_fig = plt.Figure(figsize=(3.2, 3), dpi=100)
@@ -797,21 +1582,15 @@ class FinanceTrackerApp(tk.Tk):
             pie_canvas.draw()
             pie_canvas.get_tk_widget().pack(side='left', padx=10, pady=10)
             # Bar chart for income/expense by month
-            c.execute("""
-                SELECT strftime('%m', date), type, SUM(amount) FROM transactions
-                WHERE date >= date('now', '-11 months')
-                GROUP BY strftime('%Y-%m', date), type
-            """)
-            rows = c.fetchall()
             months = [calendar.month_abbr[i + 1] for i in range(12)]
             income_vals = [0] * 12
             expense_vals = [0] * 12
-            for row in rows:
-                month_idx = int(row[0]) - 1
-                if row[1] == 'Income':
-                    income_vals[month_idx] += row[2]
+            for (ym, ttype), total in series.items():
+                month_idx = ym % 100 - 1
+                if ttype == 'Income':
+                    income_vals[month_idx] += total
                 else:
-                    expense_vals[month_idx] += row[2]
+                    expense_vals[month_idx] += total
             bar_fig = plt.Figure(figsize=(5.5, 3), dpi=100)
             bar_ax = bar_fig.add_subplot(111)
             x = range(12)
@@ -844,11 +1623,9 @@ class FinanceTrackerApp(tk.Tk):
         print(f"Loaded {len(cats)} categories for type: {ttype}")  # Debug output
 
     def refresh_overview(self):
-        c = self.conn.cursor()
-        c.execute("SELECT SUM(amount) FROM transactions WHERE type='Income'")
-        income = c.fetchone()[0] or 0
-        c.execute("SELECT SUM(amount) FROM transactions WHERE type='Expense'")
-        expense = c.fetchone()[0] or 0
+        totals = self.range_index.totals()
+        income = totals['Income']
+        expense = totals['Expense']
         balance = income - expense
         # --- Dashboard summary cards ---
         if hasattr(self, 'dash_income_val'):
@@ -861,31 +1638,75 @@ class FinanceTrackerApp(tk.Tk):
     def refresh_transactions(self):
         if not hasattr(self, 'tree'):
             return
-        # Store mapping of treeview item ID to DB transaction ID
+        # Store mapping of treeview item ID to DB transaction ID (and back, for incremental updates)
         self.tree_id_to_dbid = {}
-        for row in self.tree.get_children():
-            self.tree.delete(row)
+        self.dbid_to_tree_id = {}
         c = self.conn.cursor()
         c.execute(
-            '''SELECT t.id, t.type, c.name, t.amount, t.date, t.description FROM transactions t JOIN categories c ON t.category_id=c.id ORDER BY t.date DESC''')
+            '''SELECT t.id, t.type, c.name, t.amount, t.date, t.description FROM transactions_view t JOIN categories c ON t.category_id=c.id ORDER BY t.day DESC''')
         rows = c.fetchall()
-        for idx, row in enumerate(rows, 1):
-            item_id = self.tree.insert('', 'end', values=(idx, row[1], row[2], row[3], row[4], row[5]))
-            self.tree_id_to_dbid[item_id] = row[0]
+        dbids = [row[0] for row in rows]
+        values = [(idx, row[1], row[2], row[3], row[4], row[5]) for idx, row in enumerate(rows, 1)]
+
+        def on_insert(item_id, index):
+            self.tree_id_to_dbid[item_id] = dbids[index]
+            self.dbid_to_tree_id[dbids[index]] = item_id
+
+        self.load_tree_chunked(self.tree, values, on_insert=on_insert, progress=self.trx_load_progress,
+                               progress_frame=self.trx_load_frame, progress_label=self.trx_load_label)
         # Update charts in transaction tab
         if hasattr(self, 'trx_chart_frame'):
             self._draw_charts(self.trx_chart_frame, is_dashboard=False)
 
+    def cancel_tree_load(self, tree):
+        job = self._tree_load_jobs.pop(str(tree), None)
+        if job is not None:
+            self.after_cancel(job)
+
+    def load_tree_chunked(self, tree, rows, on_insert=None, progress=None, progress_frame=None,
+                          progress_label=None, chunk_size=TREE_CHUNK_SIZE):
+        # Replace the contents of a Treeview, inserting rows in slices across after() callbacks so
+        # the event loop keeps running while a large ledger streams in. A new load for the same
+        # tree cancels the one still in flight.
+        self.cancel_tree_load(tree)
+        tree.delete(*tree.get_children())
+        total = len(rows)
+        key = str(tree)
+        show_progress = progress is not None and total > chunk_size
+        if show_progress:
+            progress['maximum'] = total
+            progress['value'] = 0
+            if progress_frame is not None:
+                progress_frame.pack(fill='x', pady=(0, 5), before=tree)
+
+        def insert_chunk(start):
+            end = min(start + chunk_size, total)
+            for index in range(start, end):
+                item_id = tree.insert('', 'end', values=rows[index])
+                if on_insert:
+                    on_insert(item_id, index)
+            if end < total:
+                if show_progress:
+                    progress['value'] = end
+                    if progress_label is not None:
+                        progress_label['text'] = f'Loading {end:,} / {total:,} rows...'
+                self._tree_load_jobs[key] = self.after(1, insert_chunk, end)
+            else:
+                self._tree_load_jobs.pop(key, None)
+                if show_progress and progress_frame is not None:
+                    progress_frame.pack_forget()
+
+        # First slice goes in synchronously so small ledgers render exactly as before
+        insert_chunk(0)
+
     def refresh_trx_summary(self):
         # Defensive: only update if widgets exist
         if not (hasattr(self, 'lbl_trx_income') and hasattr(self, 'lbl_trx_expense') and hasattr(self,
                                                                                                  'lbl_trx_balance')):
             return
-        c = self.conn.cursor()
-        c.execute("SELECT SUM(amount) FROM transactions WHERE type='Income'")
-        income = c.fetchone()[0] or 0
-        c.execute("SELECT SUM(amount) FROM transactions WHERE type='Expense'")
-        expense = c.fetchone()[0] or 0
+        totals = self.range_index.totals()
+        income = totals['Income']
+        expense = totals['Expense']
         balance = income - expense
         self.lbl_trx_income['text'] = f'Total Income: {self.currency} {income:.2f}'
         self.lbl_trx_expense['text'] = f'Total Expense: {self.currency} {expense:.2f}'
@@ -899,7 +1720,9 @@ class FinanceTrackerApp(tk.Tk):
         desc = self.ent_desc.get()
         try:
             amt = float(amt)
-            datetime.strptime(date, '%Y-%m-%d')
+            if not math.isfinite(amt):
+                raise ValueError(amt)
+            day = to_day(date)
         except:
             messagebox.showerror('Invalid Input', 'Please enter valid amount and date.')
             return
@@ -909,12 +1732,16 @@ class FinanceTrackerApp(tk.Tk):
         if not cat_id:
             messagebox.showerror('Category Error', 'Category not found.')
             return
-        c.execute('''INSERT INTO transactions (amount, category_id, date, description, type) VALUES (?, ?, ?, ?, ?)''',
-                  (amt, cat_id[0], date, desc, ttype))
-        self.conn.commit()
-        self.refresh_all()
+        if dedupe.find_duplicate(self.conn, amt, cat_id[0], day, desc) is not None and not messagebox.askyesno(
+                'Possible Duplicate', f'A {ttype.lower()} of {amt:.2f} in {cat} with this date and description '
+                                      f'already exists. Add it anyway?'):
+            return
+        self.writes.submit(self.journal.insert, 'transactions', {'amount': amt, 'category_id': cat_id[0], 'day': day,
+                                                                 'description': desc, 'type': ttype},
+                           label='Add transaction')
         self.ent_amount.delete(0, tk.END)
         self.ent_desc.delete(0, tk.END)
+        self._category_picked = False
 
     def edit_transaction(self, event):
         # Inline editing: double-click on any cell to edit all fields
@@ -958,12 +1785,12 @@ class FinanceTrackerApp(tk.Tk):
                     cats = [row[0] for row in c.fetchall()]
                     vals[2] = cats[0] if cats else ''
                     self.tree.item(sel[0], values=vals)
-                    # Update DB
-                    c.execute(
-                        'UPDATE transactions SET type=?, category_id=(SELECT id FROM categories WHERE name=? AND type=?) WHERE id=?',
-                        (new_type, vals[2], new_type, dbid))
-                    self.conn.commit()
-                    self.refresh_all()
+                    # Update DB: type and category change together as one undoable step
+                    c.execute('SELECT id FROM categories WHERE name=? AND type=?', (vals[2], new_type))
+                    cat_row = c.fetchone()
+                    if cat_row:
+                        self.writes.submit(self.journal.update, 'transactions', dbid,
+                                           {'type': new_type, 'category_id': cat_row[0]}, label='Change type')
 
                 cb.bind('<<ComboboxSelected>>', save_type)
                 cb.bind('<FocusOut>', save_type)
@@ -984,11 +1811,11 @@ class FinanceTrackerApp(tk.Tk):
                     vals[col_index] = new_cat
                     self.tree.item(sel[0], values=vals)
                     c = self.conn.cursor()
-                    c.execute(
-                        'UPDATE transactions SET category_id=(SELECT id FROM categories WHERE name=? AND type=?) WHERE id=?',
-                        (new_cat, ttype, dbid))
-                    self.conn.commit()
-                    self.refresh_all()
+                    c.execute('SELECT id FROM categories WHERE name=? AND type=?', (new_cat, ttype))
+                    cat_row = c.fetchone()
+                    if cat_row:
+                        self.writes.submit(self.journal.update, 'transactions', dbid, {'category_id': cat_row[0]},
+                                           label='Change category')
 
                 cb.bind('<<ComboboxSelected>>', save_cat)
                 cb.bind('<FocusOut>', save_cat)
@@ -1006,13 +1833,13 @@ class FinanceTrackerApp(tk.Tk):
                         new_amt = float(new_val)
                     except ValueError:
                         return
+                    if not math.isfinite(new_amt):
+                        return
                     vals = list(self.tree.item(sel[0])['values'])
                     vals[col_index] = new_amt
                     self.tree.item(sel[0], values=vals)
-                    c = self.conn.cursor()
-                    c.execute('UPDATE transactions SET amount=? WHERE id=?', (new_amt, dbid))
-                    self.conn.commit()
-                    self.refresh_all()
+                    self.writes.submit(self.journal.update, 'transactions', dbid, {'amount': new_amt},
+                                       label='Edit amount')
 
                 entry.bind('<FocusOut>', save_amt)
                 entry.bind('<Return>', save_amt)
@@ -1027,16 +1854,14 @@ class FinanceTrackerApp(tk.Tk):
                     new_val = entry.get()
                     entry.destroy()
                     try:
-                        datetime.strptime(new_val, '%Y-%m-%d')
+                        new_day = to_day(new_val)
                     except ValueError:
                         return
                     vals = list(self.tree.item(sel[0])['values'])
                     vals[col_index] = new_val
                     self.tree.item(sel[0], values=vals)
-                    c = self.conn.cursor()
-                    c.execute('UPDATE transactions SET date=? WHERE id=?', (new_val, dbid))
-                    self.conn.commit()
-                    self.refresh_all()
+                    self.writes.submit(self.journal.update, 'transactions', dbid, {'day': new_day},
+                                       label='Edit date')
 
                 entry.bind('<FocusOut>', save_date)
                 entry.bind('<Return>', save_date)
@@ -1053,22 +1878,26 @@ class FinanceTrackerApp(tk.Tk):
                     vals = list(self.tree.item(sel[0])['values'])
                     vals[col_index] = new_val
                     self.tree.item(sel[0], values=vals)
-                    c = self.conn.cursor()
-                    c.execute('UPDATE transactions SET description=? WHERE id=?', (new_val, dbid))
-                    self.conn.commit()
-                    self.refresh_all()
+                    self.writes.submit(self.journal.update, 'transactions', dbid, {'description': new_val},
+                                       label='Edit description')
 
                 entry.bind('<FocusOut>', save_desc)
                 entry.bind('<Return>', save_desc)
 
 
 if __name__ == '__main__':
-    # Delete existing database to avoid schema conflicts
-    if os.path.exists(DB_FILE):
-        os.remove(DB_FILE)
-        print(f"Removed existing {DB_FILE} to avoid schema conflicts")
-
-    # Initialize with correct schema
+    # `python main.py serve` runs the local JSON API instead of the UI, against the existing database
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        import server
+
+        server.main(sys.argv[2:], DB_FILE, init_db)
+        sys.exit(0)
+    # `python main.py sync other.db` exchanges changes with another ledger file
+    if len(sys.argv) > 1 and sys.argv[1] == 'sync':
+        sync.main(sys.argv[2:], DB_FILE, init_db)
+        sys.exit(0)
+
+    # Create missing tables and bring older schemas up to date; existing data is kept
     init_db()
 
     if not TKCALENDAR_AVAILABLE:
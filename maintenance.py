@@ -0,0 +1,152 @@
+import datetime
+import sqlite3
+import threading
+import time
+
+# Pages freed per incremental_vacuum step, and the pause between steps that lets other work through
+VACUUM_PAGES_PER_STEP = 128
+VACUUM_STEP_SLEEP = 0.01
+# Rows ANALYZE samples per index (PRAGMA analysis_limit), which keeps it fast on large tables
+ANALYSIS_LIMIT = 1000
+# How long a maintenance statement waits on the app's write lock before giving up for this run
+MAINTENANCE_BUSY_TIMEOUT = 0.25
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def analyze(conn):
+    # Planner statistics: a full (sampled) ANALYZE the first time, PRAGMA optimize afterwards,
+    # which only re-analyzes tables whose contents changed enough to matter
+    conn.execute(f'PRAGMA analysis_limit={ANALYSIS_LIMIT}')
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'").fetchone() is None:
+        conn.execute('ANALYZE')
+    else:
+        conn.execute('PRAGMA optimize')
+    if conn.in_transaction:
+        conn.commit()
+
+
+def incremental_vacuum(conn, pages=VACUUM_PAGES_PER_STEP, sleep=VACUUM_STEP_SLEEP, stop=None):
+    # Returns free pages handed back to the filesystem. Each step is its own short write
+    # transaction, so the app's writes wait at most one step; stops early once stop is set.
+    # Needs auto_vacuum=INCREMENTAL (see compact()); does nothing otherwise.
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        return 0
+    reclaimed = 0
+    while stop is None or not stop.is_set():
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if not free:
+            break
+        # One short transaction per step. Python's sqlite3 steps a statement without result
+        # columns only once and each step frees one page, hence one execute per page.
+        conn.execute('BEGIN IMMEDIATE')
+        for _ in range(min(pages, free)):
+            conn.execute('PRAGMA incremental_vacuum(1)')
+        conn.commit()
+        reclaimed += free - conn.execute('PRAGMA freelist_count').fetchone()[0]
+        time.sleep(sleep)
+    return reclaimed
+
+
+def quick_check(conn):
+    # [] when the file is sound, else SQLite's problem descriptions; a read, so it never blocks writers
+    problems = [row[0] for row in conn.execute('PRAGMA quick_check').fetchall()]
+    return [] if problems == ['ok'] else problems
+
+
+def compact(db_file):
+    # One-off full VACUUM that also switches an older file to incremental auto-vacuum, so later
+    # runs can reclaim space in small steps. Rewrites the whole file and holds the write lock
+    # while it does; returns bytes saved.
+    conn = sqlite3.connect(db_file)
+    try:
+        before = _file_bytes(conn)
+        conn.execute(f'PRAGMA auto_vacuum={AUTO_VACUUM_INCREMENTAL}')
+        conn.execute('VACUUM')
+        return before - _file_bytes(conn)
+    finally:
+        conn.close()
+
+
+def _file_bytes(conn):
+    return conn.execute('PRAGMA page_count').fetchone()[0] * conn.execute('PRAGMA page_size').fetchone()[0]
+
+
+class MaintenanceScheduler:
+    # Runs ANALYZE/optimize, incremental vacuum and quick_check on a worker thread with its own
+    # connection, so the UI thread never waits on them. The app starts a run when it has been
+    # idle for a while and interrupts it on user input; the UI polls running()/last_result.
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        # Dict describing the last finished run (see _run), or None
+        self.last_result = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, task=None):
+        # task: None for a regular run, 'compact' for a full VACUUM
+        if self.running():
+            return False
+        self._stop.clear()
+        target = self._compact if task == 'compact' else self._run
+        self._thread = threading.Thread(target=target, name='ledger-maintenance', daemon=True)
+        self._thread.start()
+        return True
+
+    def interrupt(self):
+        # Ends the current run after its current step; later steps are left for the next run
+        self._stop.set()
+
+    def _run(self):
+        result = {'task': 'maintenance', 'finished': None, 'error': None, 'interrupted': False,
+                  'analyze_seconds': None, 'vacuum_seconds': None, 'reclaimed_bytes': 0,
+                  'incremental': False, 'free_bytes': 0, 'check_seconds': None, 'problems': None}
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_file, timeout=MAINTENANCE_BUSY_TIMEOUT)
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+            started = time.perf_counter()
+            analyze(conn)
+            result['analyze_seconds'] = time.perf_counter() - started
+            if not self._stop.is_set():
+                started = time.perf_counter()
+                result['reclaimed_bytes'] = incremental_vacuum(conn, stop=self._stop) * page_size
+                result['vacuum_seconds'] = time.perf_counter() - started
+            result['incremental'] = conn.execute('PRAGMA auto_vacuum').fetchone()[0] == AUTO_VACUUM_INCREMENTAL
+            result['free_bytes'] = conn.execute('PRAGMA freelist_count').fetchone()[0] * page_size
+            if not self._stop.is_set():
+                started = time.perf_counter()
+                result['problems'] = quick_check(conn)
+                result['check_seconds'] = time.perf_counter() - started
+        except sqlite3.OperationalError as e:
+            # The app held its write lock past the busy timeout: try again on the next idle stretch
+            if 'locked' in str(e) or 'busy' in str(e):
+                self._stop.set()
+            else:
+                result['error'] = str(e)
+        except sqlite3.Error as e:
+            result['error'] = str(e)
+        finally:
+            if conn is not None:
+                conn.close()
+        result['interrupted'] = self._stop.is_set()
+        result['finished'] = datetime.datetime.now()
+        self.last_result = result
+
+    def _compact(self):
+        started = time.perf_counter()
+        result = {'task': 'compact', 'finished': None, 'error': None, 'saved_bytes': 0, 'seconds': None}
+        try:
+            result['saved_bytes'] = compact(self.db_file)
+        except sqlite3.Error as e:
+            result['error'] = str(e)
+        result['seconds'] = time.perf_counter() - started
+        result['finished'] = datetime.datetime.now()
+        self.last_result = result
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,132 @@
+from collections import OrderedDict
+
+from dates import to_day
+
+# Upper bound on memoized results kept for one data version
+CACHE_MAXSIZE = 64
+
+
+def stored_columns(conn, table, schema='main'):
+    # Column names of table that hold data. Generated columns (hidden != 0 in table_xinfo) can't be
+    # written, and a copy into a table of the same shape recomputes them, so they are left out.
+    c = conn.execute(f'PRAGMA {schema}.table_xinfo({table})')
+    return [row[1] for row in c.fetchall() if row[6] == 0]
+
+
+def data_version(conn):
+    # Moves whenever another connection commits to the file; this connection's own commits don't move it
+    return conn.execute('PRAGMA data_version').fetchone()[0]
+
+
+class LedgerIndex:
+    # Base for in-memory state built by load(conn) and then kept current from journal operations.
+    # Commits from other connections (the API server, a sync) move PRAGMA data_version, and the
+    # next read reloads; so does setting _stale when an operation can't be applied in place.
+    conn = None
+    _data_version = None
+    _stale = False
+
+    def _loaded(self, conn):
+        # Called at the end of load()
+        self.conn = conn
+        self._data_version = data_version(conn)
+        self._stale = False
+
+    def _fresh(self):
+        if self.conn is not None and (self._stale or data_version(self.conn) != self._data_version):
+            self.load(self.conn)
+
+
+# --- DERIVED QUERIES ---
+# Archived years only live on as per-day rollups in the main database (see archive.py), so every
+# aggregate below reads the live table plus archive_rollups and never has to attach an archive file.
+def range_totals(conn, start, end):
+    # Income and expense totals for transactions dated between start and end (inclusive)
+    start, end = to_day(start), to_day(end)
+    c = conn.cursor()
+    c.execute('''SELECT type, SUM(amount) FROM (
+                     SELECT type, amount FROM transactions WHERE day BETWEEN ? AND ?
+                     UNION ALL
+                     SELECT type, total FROM archive_rollups WHERE day BETWEEN ? AND ?
+                 ) GROUP BY type''', (start, end, start, end))
+    totals = {'Income': 0, 'Expense': 0}
+    for ttype, total in c.fetchall():
+        totals[ttype] = total or 0
+    return totals
+
+
+def category_breakdown(conn, ttype='Expense', start=None, end=None):
+    # [(category name, total)] for one transaction type, over the whole ledger unless a range is given
+    start = 0 if start is None else to_day(start)
+    end = 1 << 31 if end is None else to_day(end)
+    c = conn.cursor()
+    c.execute('''
+        SELECT c.name, SUM(t.amount) FROM (
+            SELECT category_id, amount FROM transactions WHERE type=? AND day BETWEEN ? AND ?
+            UNION ALL
+            SELECT category_id, total FROM archive_rollups WHERE type=? AND day BETWEEN ? AND ?
+        ) t
+        JOIN categories c ON t.category_id = c.id
+        GROUP BY c.name
+    ''', (ttype, start, end, ttype, start, end))
+    return c.fetchall()
+
+
+def monthly_series(conn, start, end=None):
+    # {(year-month number, type): total} for transactions dated on or after start (and before end, if given)
+    start = to_day(start)
+    end = 1 << 31 if end is None else to_day(end)
+    c = conn.cursor()
+    c.execute('''SELECT ym, type, SUM(amount) FROM (
+                     SELECT ym, type, amount FROM transactions WHERE day >= ? AND day < ?
+                     UNION ALL
+                     SELECT ym, type, total FROM archive_rollups WHERE day >= ? AND day < ?
+                 ) GROUP BY ym, type''', (start, end, start, end))
+    return {(month, ttype): total for month, ttype, total in c.fetchall()}
+
+
+# --- CACHING ---
+class DerivedCache:
+    # Memoizes derived results (breakdowns, series; range totals come from fenwick.RangeIndex) until
+    # the data changes. The version pairs this connection's total_changes counter, which grows with
+    # every row written through it, with PRAGMA data_version, which moves when another connection
+    # commits to the same file.
+
+    def __init__(self, conn, maxsize=CACHE_MAXSIZE):
+        self.conn = conn
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._entries = OrderedDict()
+
+    def clear(self):
+        # For changes the version can't see, e.g. a restore copied in underneath the connection
+        self._entries.clear()
+        self._version = None
+
+    def data_version(self):
+        return self.conn.total_changes, data_version(self.conn)
+
+    def get(self, key, compute):
+        version = self.data_version()
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        self.misses += 1
+        value = compute()
+        self._entries[key] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return value
+
+    def category_breakdown(self, ttype='Expense', start=None, end=None):
+        return self.get(('category_breakdown', ttype, str(start), str(end)),
+                        lambda: category_breakdown(self.conn, ttype, start, end))
+
+    def monthly_series(self, start, end=None):
+        return self.get(('monthly_series', str(start), str(end)), lambda: monthly_series(self.conn, start, end))
@@ -0,0 +1,150 @@
+import re
+
+RULE_KINDS = ('contains', 'regex')
+# Distinct descriptions whose matches are remembered during one classify_many() call
+MATCH_CACHE_SIZE = 100_000
+
+
+def _trie_pattern(words):
+    # One regex for a set of literal words, factored by common prefix so the matcher branches on
+    # one character at a time instead of trying every word; the longest word wins at a position
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+class RuleEngine:
+    # Description/amount rules that pick a category, highest priority first (ties: oldest rule).
+    # 'contains' keywords are compiled into a single keyword automaton (a prefix-factored regex run
+    # as a lookahead at every position of the casefolded description), so one scan finds every
+    # keyword rule that matches; 'regex' rules are searched individually. The first matching rule,
+    # in priority order, whose amount range and category type accept the row decides.
+
+    def __init__(self):
+        # (rule id, kind, pattern, category id, min amount, max amount, priority), in match order
+        self.rules = []
+        self.category_types = {}
+        self._keywords = None
+        # keyword -> indexes of the keyword rules it satisfies (itself and every prefix keyword)
+        self._keyword_rules = {}
+        self._always = []
+        self._regexes = []
+        # Per rule: (category id, category type, min amount, max amount)
+        self._checks = []
+
+    def load(self, conn):
+        c = conn.cursor()
+        c.execute('''SELECT id, kind, pattern, category_id, min_amount, max_amount, priority FROM category_rules
+                     ORDER BY priority DESC, id''')
+        self.rules = c.fetchall()
+        c.execute('SELECT id, type FROM categories')
+        self.category_types = dict(c.fetchall())
+        self._compile()
+
+    def _compile(self):
+        by_keyword = {}
+        self._always = []
+        self._regexes = []
+        for index, (_, kind, pattern, *_) in enumerate(self.rules):
+            if kind == 'regex':
+                self._regexes.append((index, re.compile(pattern, re.IGNORECASE | re.DOTALL)))
+            elif pattern:
+                by_keyword.setdefault(pattern.casefold(), []).append(index)
+            else:
+                self._always.append(index)
+        self._keyword_rules = {
+            keyword: sorted(i for other, indexes in by_keyword.items() if keyword.startswith(other) for i in indexes)
+            for keyword in by_keyword}
+        self._keywords = re.compile(f'(?=({_trie_pattern(by_keyword)}))') if by_keyword else None
+        self._checks = [(cat_id, self.category_types.get(cat_id), lo, hi) for _, _, _, cat_id, lo, hi, _ in self.rules]
+
+    def add_rule(self, conn, kind, pattern, category_id, min_amount=None, max_amount=None, priority=0):
+        # Raises ValueError for an unknown kind or an invalid regex
+        if kind not in RULE_KINDS:
+            raise ValueError(f'Rule kind must be one of {", ".join(RULE_KINDS)}')
+        if kind == 'regex':
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f'Invalid pattern: {e}')
+        c = conn.cursor()
+        c.execute('''INSERT INTO category_rules (kind, pattern, category_id, min_amount, max_amount, priority)
+                     VALUES (?, ?, ?, ?, ?, ?)''', (kind, pattern, category_id, min_amount, max_amount, priority))
+        conn.commit()
+        self.load(conn)
+        return c.lastrowid
+
+    def delete_rule(self, conn, rule_id):
+        conn.execute('DELETE FROM category_rules WHERE id=?', (rule_id,))
+        conn.commit()
+        self.load(conn)
+
+    def matches(self, description):
+        # Indexes into self.rules of every rule whose pattern matches, best first
+        description = description or ''
+        found = set(self._always)
+        if self._keywords is not None:
+            keyword_rules = self._keyword_rules
+            for keyword in self._keywords.findall(description.casefold()):
+                found.update(keyword_rules[keyword])
+        for index, regex in self._regexes:
+            if regex.search(description):
+                found.add(index)
+        return sorted(found)
+
+    def _pick(self, candidates, amount, ttype):
+        # First candidate whose category still exists, has the row's type and whose amount range
+        # (if any) holds the amount
+        for index in candidates:
+            cat_id, cat_type, lo, hi = self._checks[index]
+            if cat_type is None or ttype not in (None, cat_type):
+                continue
+            if amount is None:
+                if lo is None and hi is None:
+                    return cat_id
+            elif (lo is None or amount >= lo) and (hi is None or amount <= hi):
+                return cat_id
+        return None
+
+    def classify(self, description, amount=None, ttype=None):
+        # Category id for a description (and amount / transaction type, when given), or None
+        return self._pick(self.matches(description), amount, ttype)
+
+    def classify_many(self, rows):
+        # [category id or None] for (description, amount, type) rows. Matching depends only on the
+        # description, so it runs once per distinct description.
+        matched = {}
+        result = []
+        append = result.append
+        for description, amount, ttype in rows:
+            candidates = matched.get(description)
+            if candidates is None:
+                if len(matched) >= MATCH_CACHE_SIZE:
+                    matched.clear()
+                candidates = matched[description] = self.matches(description)
+            append(self._pick(candidates, amount, ttype) if candidates else None)
+        return result
+
+    def recategorize(self, conn):
+        # {transaction id: {'category_id': new id}} for every row a rule assigns to a different
+        # category of the same type; rows no rule matches keep their category
+        if not self.rules:
+            return {}
+        c = conn.cursor()
+        c.execute('SELECT id, description, amount, type, category_id FROM transactions')
+        rows = c.fetchall()
+        targets = self.classify_many((description, amount, ttype) for _, description, amount, ttype, _ in rows)
+        return {row[0]: {'category_id': target} for row, target in zip(rows, targets)
+                if target is not None and target != row[4]}
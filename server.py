@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import json
+import math
+import queue
+import sqlite3
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+import queries
+import dedupe
+from dates import to_day
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+READ_POOL_SIZE = 8
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 500
+# Bodies above this size are rejected before being read
+MAX_BODY_BYTES = 64 * 1024
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# --- CONNECTIONS ---
+class ReadPool:
+    # Read-only connections handed out to a thread executor; one connection per worker thread,
+    # so a query never waits for a connection, only for a free worker.
+
+    def __init__(self, db_file, size=READ_POOL_SIZE):
+        self._conns = queue.SimpleQueue()
+        for _ in range(size):
+            conn = sqlite3.connect(f'file:{db_file}?mode=ro', uri=True, check_same_thread=False)
+            self._conns.put(conn)
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='ledger-read')
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._call, fn, args)
+
+    def _call(self, fn, args):
+        conn = self._conns.get()
+        try:
+            return fn(conn, *args)
+        finally:
+            self._conns.put(conn)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        while not self._conns.empty():
+            self._conns.get().close()
+
+
+class Writer:
+    # The single writer: one connection owned by one worker thread, so writes are serialized
+    # without any locking on the event loop.
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.conn = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ledger-write',
+                                           initializer=self._open)
+
+    def _open(self):
+        self.conn = sqlite3.connect(self.db_file)
+        self.conn.execute('PRAGMA busy_timeout=5000')
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, lambda: fn(self.conn, *args))
+
+    def close(self):
+        def _close():
+            if self.conn is not None:
+                self.conn.close()
+        self.executor.submit(_close)
+        self.executor.shutdown(wait=True)
+
+
+# --- HANDLERS ---
+def _parse_date(value, name):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise HTTPError(400, f'{name} must be a YYYY-MM-DD date')
+
+
+def _range_params(params):
+    today = datetime.date.today()
+    start = _parse_date(params['start'], 'start') if 'start' in params else today.replace(day=1)
+    end = _parse_date(params['end'], 'end') if 'end' in params else today
+    return start, end
+
+
+def _int_param(params, name, default, lo, hi):
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise HTTPError(400, f'{name} must be an integer')
+    return max(lo, min(value, hi))
+
+
+def list_transactions(conn, page, size):
+    c = conn.cursor()
+    c.execute('SELECT COUNT(*) FROM transactions')
+    total = c.fetchone()[0]
+    c.execute('''SELECT t.id, t.type, c.name, t.amount, t.date, t.description FROM transactions_view t
+                 JOIN categories c ON t.category_id=c.id ORDER BY t.day DESC, t.id DESC LIMIT ? OFFSET ?''',
+              (size, (page - 1) * size))
+    items = [dict(zip(('id', 'type', 'category', 'amount', 'date', 'description'), row)) for row in c.fetchall()]
+    return {'page': page, 'size': size, 'total': total, 'items': items}
+
+
+def insert_transaction(conn, payload):
+    ttype = payload.get('type')
+    if ttype not in ('Income', 'Expense'):
+        raise HTTPError(400, 'type must be Income or Expense')
+    try:
+        amount = float(payload['amount'])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPError(400, 'amount must be a number')
+    if isinstance(payload['amount'], bool) or not math.isfinite(amount):
+        raise HTTPError(400, 'amount must be a number')
+    date = _parse_date(payload.get('date', str(datetime.date.today())), 'date')
+    description = payload.get('description', '')
+    if not isinstance(description, str):
+        raise HTTPError(400, 'description must be a string')
+    if not isinstance(payload.get('category'), str):
+        raise HTTPError(400, 'category must be a string')
+    c = conn.cursor()
+    c.execute('SELECT id FROM categories WHERE name=? AND type=?', (payload.get('category'), ttype))
+    cat_id = c.fetchone()
+    if not cat_id:
+        raise HTTPError(400, 'Category not found.')
+    day = to_day(date)
+    c.execute('INSERT INTO transactions (amount, category_id, day, description, type, fingerprint) '
+              'VALUES (?, ?, ?, ?, ?, ?)',
+              (amount, cat_id[0], day, description, ttype, dedupe.fingerprint(amount, cat_id[0], day, description)))
+    conn.commit()
+    return {'id': c.lastrowid}
+
+
+class LedgerServer:
+    def __init__(self, db_file, pool_size=READ_POOL_SIZE):
+        self.reads = ReadPool(db_file, pool_size)
+        self.writer = Writer(db_file)
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path = url.path.rstrip('/') or '/'
+        if path == '/transactions':
+            if method == 'GET':
+                page = _int_param(params, 'page', 1, 1, 10 ** 9)
+                size = _int_param(params, 'size', PAGE_SIZE_DEFAULT, 1, PAGE_SIZE_MAX)
+                return 200, await self.reads.run(list_transactions, page, size)
+            if method == 'POST':
+                try:
+                    payload = json.loads(body or b'{}')
+                except ValueError:
+                    raise HTTPError(400, 'Body must be JSON')
+                if not isinstance(payload, dict):
+                    raise HTTPError(400, 'Body must be a JSON object')
+                return 201, await self.writer.run(insert_transaction, payload)
+            raise HTTPError(405, 'Use GET or POST')
+        if method != 'GET':
+            raise HTTPError(405, 'Use GET')
+        if path == '/totals':
+            start, end = _range_params(params)
+            totals = await self.reads.run(queries.range_totals, start, end)
+            return 200, {'start': str(start), 'end': str(end), 'income': totals['Income'],
+                         'expense': totals['Expense'], 'balance': totals['Income'] - totals['Expense']}
+        if path == '/categories':
+            ttype = params.get('type', 'Expense')
+            if ttype not in ('Income', 'Expense'):
+                raise HTTPError(400, 'type must be Income or Expense')
+            start, end = (_range_params(params) if 'start' in params or 'end' in params else (None, None))
+            rows = await self.reads.run(queries.category_breakdown, ttype, start, end)
+            return 200, {'type': ttype, 'categories': [{'name': name, 'total': total} for name, total in rows]}
+        raise HTTPError(404, 'Not found')
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                try:
+                    length = int(headers.get('content-length', 0))
+                    if length > MAX_BODY_BYTES:
+                        keep_alive = False
+                        raise HTTPError(413, 'Body too large')
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = await self.dispatch(method, target, body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except ValueError:
+                    status, payload, keep_alive = 400, {'error': 'Bad request'}, False
+                except sqlite3.Error as e:
+                    status, payload = 500, {'error': str(e)}
+                data = json.dumps(payload).encode()
+                writer.write((f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                              f'Content-Type: application/json\r\n'
+                              f'Content-Length: {len(data)}\r\n'
+                              f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n').encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_forever(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        print(f'Serving ledger on http://{host}:{port} ({self.reads.size} read connections)')
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.reads.close()
+        self.writer.close()
+
+
+def main(argv, db_file, prepare_file):
+    parser = argparse.ArgumentParser(prog='main.py serve', description='Serve the ledger as a local JSON API.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--pool-size', type=int, default=READ_POOL_SIZE)
+    parser.add_argument('--db', default=db_file)
+    args = parser.parse_args(argv)
+    prepare_file(args.db)
+    app = LedgerServer(args.db, args.pool_size)
+    try:
+        asyncio.run(app.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        app.close()
@@ -0,0 +1,287 @@
+import argparse
+import datetime
+import json
+import sqlite3
+import uuid
+from contextlib import contextmanager
+
+import dedupe
+
+# Change tracking: every row of a synced table carries a uid (stable across files), a version
+# and the site that wrote that version. version is a Lamport clock: each local write takes
+# sync_state.clock + 1, and applying remote changes moves the clock past everything seen, so
+# (version, origin) orders all writes to a row the same way in every file. Triggers keep the
+# newest stamp per row (tombstones for deletes) in sync_changes, whose seq only grows; a peer
+# remembers the last seq it pulled from each site and asks only for what came after it.
+
+# Synced tables and the columns that travel; category_id travels as the category's uid
+SYNC_TABLES = {
+    'categories': ('name', 'type'),
+    'subscriptions': ('name', 'amount', 'category_id', 'type', 'frequency', 'next_due'),
+    'transactions': ('amount', 'category_id', 'day', 'description', 'type'),
+}
+# Categories created independently under the same name are the same category everywhere
+_NEW_UID = {
+    'categories': """CASE WHEN EXISTS (SELECT 1 FROM categories WHERE uid = 'category:' || lower(NEW.name))
+                          THEN lower(hex(randomblob(16))) ELSE 'category:' || lower(NEW.name) END""",
+    'subscriptions': 'lower(hex(randomblob(16)))',
+    'transactions': 'lower(hex(randomblob(16)))',
+}
+
+
+def _log(table, row):
+    return f'''INSERT OR REPLACE INTO sync_changes (tbl, uid, version, origin, deleted)
+               SELECT '{table}', uid, version, origin, 0 FROM {table} WHERE id = {row}.id;'''
+
+
+def _triggers(table):
+    when = 'WHEN (SELECT muted FROM sync_state) = 0'
+    stamp = "version = (SELECT clock FROM sync_state), origin = (SELECT site FROM sync_state)"
+    return (
+        f'''CREATE TRIGGER IF NOT EXISTS trg_sync_{table}_insert AFTER INSERT ON {table} {when}
+            BEGIN
+                UPDATE sync_state SET clock = clock + 1;
+                UPDATE {table} SET uid = COALESCE(NEW.uid, {_NEW_UID[table]}), {stamp} WHERE id = NEW.id;
+                {_log(table, 'NEW')}
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_sync_{table}_update AFTER UPDATE OF {", ".join(SYNC_TABLES[table])}
+            ON {table} {when}
+            BEGIN
+                UPDATE sync_state SET clock = clock + 1;
+                UPDATE {table} SET {stamp} WHERE id = NEW.id;
+                {_log(table, 'NEW')}
+            END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_sync_{table}_delete AFTER DELETE ON {table} {when}
+            BEGIN
+                UPDATE sync_state SET clock = clock + 1;
+                INSERT OR REPLACE INTO sync_changes (tbl, uid, version, origin, deleted)
+                VALUES ('{table}', OLD.uid, (SELECT clock FROM sync_state), (SELECT site FROM sync_state), 1);
+            END''',
+    )
+
+
+SYNC_TRIGGERS = tuple(sql for table in SYNC_TABLES for sql in _triggers(table))
+
+
+def prepare(c):
+    # Schema for change tracking on a cursor inside init_db(). Rows that predate tracking get
+    # uids from their ids, so two copies of the same file agree on which rows are the same;
+    # their version 0 loses to any tracked edit.
+    c.execute('''CREATE TABLE IF NOT EXISTS sync_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        site TEXT NOT NULL,
+        clock INTEGER NOT NULL,
+        muted INTEGER NOT NULL DEFAULT 0
+    )''')
+    c.execute('INSERT OR IGNORE INTO sync_state (id, site, clock) VALUES (1, ?, 0)', (uuid.uuid4().hex,))
+    c.execute('''CREATE TABLE IF NOT EXISTS sync_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        tbl TEXT NOT NULL,
+        uid TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        origin TEXT NOT NULL,
+        deleted INTEGER NOT NULL,
+        UNIQUE (tbl, uid)
+    )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS sync_peers (
+        site TEXT PRIMARY KEY,
+        pulled_seq INTEGER NOT NULL
+    )''')
+    for table in SYNC_TABLES:
+        cols = [row[1] for row in c.execute(f'PRAGMA table_xinfo({table})').fetchall()]
+        if 'uid' not in cols:
+            c.execute(f'ALTER TABLE {table} ADD COLUMN uid TEXT')
+            c.execute(f'ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+            c.execute(f"ALTER TABLE {table} ADD COLUMN origin TEXT NOT NULL DEFAULT ''")
+        uid = "'category:' || lower(name)" if table == 'categories' else f"'{table}:' || id"
+        c.execute(f'UPDATE {table} SET uid = {uid} WHERE uid IS NULL')
+        c.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_uid ON {table} (uid)')
+        c.execute(f'''INSERT OR IGNORE INTO sync_changes (tbl, uid, version, origin, deleted)
+                      SELECT '{table}', uid, version, origin, 0 FROM {table}''')
+    for trigger in SYNC_TRIGGERS:
+        c.execute(trigger)
+
+
+@contextmanager
+def untracked(conn):
+    # Writes inside this block are not stamped or logged (remote changes being applied, rows
+    # moving to an archive partition)
+    conn.execute('UPDATE sync_state SET muted = 1')
+    try:
+        yield
+    finally:
+        conn.execute('UPDATE sync_state SET muted = 0')
+
+
+def site_id(conn):
+    return conn.execute('SELECT site FROM sync_state').fetchone()[0]
+
+
+def reset_site(conn):
+    # A new identity for this file, e.g. after it was copied or restored from a backup; peers
+    # then pull its whole log once instead of skipping changes they think they have seen
+    conn.execute('UPDATE sync_state SET site = ?', (uuid.uuid4().hex,))
+    conn.commit()
+
+
+def split_copy(copy, original_path):
+    # copy and the file at original_path share a site id because one started as a copy of the
+    # other. Gives copy its own identity and moves the changes it logged since then (those the
+    # original doesn't have stamped the same way) over to it; under the shared id the original
+    # would skip them as its own writes.
+    old_site = site_id(copy)
+    new_site = uuid.uuid4().hex
+    diverged = '''SELECT uid FROM sync_changes ch WHERE ch.tbl = ? AND ch.origin = ? AND NOT EXISTS (
+                      SELECT 1 FROM original.sync_changes o
+                      WHERE o.tbl = ch.tbl AND o.uid = ch.uid AND o.version = ch.version AND o.origin = ch.origin)'''
+    copy.execute('ATTACH DATABASE ? AS original', (original_path,))
+    try:
+        with copy:
+            copy.execute('UPDATE sync_state SET site = ?', (new_site,))
+            for table in SYNC_TABLES:
+                copy.execute(f'UPDATE {table} SET origin = ? WHERE origin = ? AND uid IN ({diverged})',
+                             (new_site, old_site, table, old_site))
+            copy.execute('''UPDATE sync_changes SET origin = ? WHERE origin = ? AND NOT EXISTS (
+                                SELECT 1 FROM original.sync_changes o
+                                WHERE o.tbl = sync_changes.tbl AND o.uid = sync_changes.uid
+                                  AND o.version = sync_changes.version AND o.origin = sync_changes.origin)''',
+                         (new_site, old_site))
+    finally:
+        copy.execute('DETACH DATABASE original')
+
+
+def export_changes(conn, since_seq=0, skip=frozenset(), receiver=None):
+    # (changes, last seq) for everything logged after since_seq, as plain dicts ready for JSON.
+    # Changes the receiver is known to have are left out: those it wrote itself (receiver is its
+    # site) and the (table, uid, version, origin) stamps in skip.
+    changes = []
+    c = conn.cursor()
+    for table, cols in SYNC_TABLES.items():
+        select = ', '.join('cat.uid' if col == 'category_id' else f't.{col}' for col in cols)
+        join = 'LEFT JOIN categories cat ON cat.id = t.category_id' if 'category_id' in cols else ''
+        c.execute(f'''SELECT ch.seq, ch.uid, ch.version, ch.origin, ch.deleted, t.id, {select}
+                      FROM sync_changes ch LEFT JOIN {table} t ON t.uid = ch.uid {join}
+                      WHERE ch.tbl = ? AND ch.seq > ? AND ch.origin IS NOT ? ORDER BY ch.seq''',
+                  (table, since_seq, receiver))
+        for seq, uid, version, origin, deleted, rowid, *values in c.fetchall():
+            if not deleted and rowid is None:
+                # Moved out of the live table (archived) without being deleted
+                continue
+            if (table, uid, version, origin) in skip:
+                continue
+            change = {'seq': seq, 'table': table, 'uid': uid, 'version': version, 'origin': origin,
+                      'deleted': bool(deleted)}
+            if not deleted:
+                change['row'] = dict(zip(['category_uid' if col == 'category_id' else col for col in cols], values))
+            changes.append(change)
+    changes.sort(key=lambda change: change['seq'])
+    last = c.execute('SELECT COALESCE(MAX(seq), 0) FROM sync_changes').fetchone()[0]
+    return changes, max(last, since_seq)
+
+
+def _archived_years(conn):
+    c = conn.execute('SELECT year FROM archived_years')
+    return {year for year, in c.fetchall()}
+
+
+def apply_changes(conn, changes):
+    # Applies remote changes whose (version, origin) beats the local stamp for the row and returns
+    # how many were applied. Categories go first so transactions can resolve their category uids;
+    # rows dated in a locally archived (closed) year are left alone.
+    order = list(SYNC_TABLES)
+    changes = sorted(changes, key=lambda change: (order.index(change['table']), change['seq']))
+    archived = _archived_years(conn)
+    applied = 0
+    c = conn.cursor()
+    with conn, untracked(conn):
+        for change in changes:
+            table, uid = change['table'], change['uid']
+            c.execute('SELECT version, origin FROM sync_changes WHERE tbl=? AND uid=?', (table, uid))
+            local = c.fetchone()
+            if local is not None and tuple(local) >= (change['version'], change['origin']):
+                continue
+            if change['deleted']:
+                c.execute(f'DELETE FROM {table} WHERE uid=?', (uid,))
+            else:
+                values = dict(change['row'])
+                if 'category_uid' in values:
+                    c.execute('SELECT id FROM categories WHERE uid=?', (values.pop('category_uid'),))
+                    found = c.fetchone()
+                    # A category deleted here keeps its transactions, as deleting it locally would
+                    values['category_id'] = found[0] if found else 0
+                if table == 'transactions':
+                    if datetime.date.fromordinal(values['day']).year in archived:
+                        continue
+                    values['fingerprint'] = dedupe.fingerprint(values['amount'], values['category_id'],
+                                                               values['day'], values['description'])
+                values.update(version=change['version'], origin=change['origin'])
+                _upsert(c, table, uid, values)
+            c.execute('''INSERT OR REPLACE INTO sync_changes (tbl, uid, version, origin, deleted)
+                         VALUES (?, ?, ?, ?, ?)''', (table, uid, change['version'], change['origin'],
+                                                     int(change['deleted'])))
+            applied += 1
+        if changes:
+            c.execute('UPDATE sync_state SET clock = MAX(clock, ?)', (max(change['version'] for change in changes),))
+    return applied
+
+
+def _upsert(c, table, uid, values):
+    cols = list(values)
+    c.execute(f'SELECT id FROM {table} WHERE uid=?', (uid,))
+    existing = c.fetchone()
+    for attempt in range(2):
+        try:
+            if existing:
+                c.execute(f'UPDATE {table} SET {", ".join(f"{col}=?" for col in cols)} WHERE id=?',
+                          [values[col] for col in cols] + [existing[0]])
+            else:
+                c.execute(f'INSERT INTO {table} ({", ".join(cols)}, uid) VALUES ({", ".join("?" * len(cols))}, ?)',
+                          [values[col] for col in cols] + [uid])
+            return
+        except sqlite3.IntegrityError:
+            # Two different categories renamed to the same name: keep both, the incoming one suffixed
+            if table != 'categories' or attempt:
+                raise
+            values['name'] = f'{values["name"]} ({values["origin"][:6]})'
+
+
+def pull(conn, peer, skip=frozenset()):
+    # Brings conn up to date with everything peer logged since the last pull from it. Returns
+    # (changes applied, bytes of change data moved, stamps received).
+    peer_site = site_id(peer)
+    row = conn.execute('SELECT pulled_seq FROM sync_peers WHERE site=?', (peer_site,)).fetchone()
+    changes, last = export_changes(peer, row[0] if row else 0, skip, site_id(conn))
+    applied = apply_changes(conn, changes)
+    with conn:
+        conn.execute('INSERT INTO sync_peers (site, pulled_seq) VALUES (?, ?) '
+                     'ON CONFLICT (site) DO UPDATE SET pulled_seq = excluded.pulled_seq', (peer_site, last))
+    received = {(change['table'], change['uid'], change['version'], change['origin']) for change in changes}
+    return applied, len(json.dumps(changes)), received
+
+
+def sync_files(path, other_path):
+    # Two-way sync between two ledger files; both must already have the current schema
+    conn = sqlite3.connect(path)
+    other = sqlite3.connect(other_path)
+    try:
+        if site_id(conn) == site_id(other):
+            # One file started as a copy of the other: give the copy its own identity
+            split_copy(other, path)
+        pulled = pull(conn, other)
+        # What conn just received would only echo back
+        pushed = pull(other, conn, skip=pulled[2])
+    finally:
+        other.close()
+        conn.close()
+    return pulled[:2], pushed[:2]
+
+
+def main(argv, db_file, prepare_file):
+    parser = argparse.ArgumentParser(prog='main.py sync', description='Exchange changes with another ledger file.')
+    parser.add_argument('other', help='path of the other ledger database')
+    parser.add_argument('--db', default=db_file)
+    args = parser.parse_args(argv)
+    prepare_file(args.db)
+    prepare_file(args.other)
+    (pulled, pulled_bytes), (pushed, pushed_bytes) = sync_files(args.db, args.other)
+    print(f'Pulled {pulled} change(s) ({pulled_bytes} bytes), pushed {pushed} change(s) ({pushed_bytes} bytes).')
@@ -0,0 +1,76 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sync  # noqa: E402
+from main import init_db  # noqa: E402
+
+DAY = 739000
+
+
+def add_transaction(conn, description, amount):
+    conn.execute('INSERT INTO transactions (amount, category_id, day, description, type) VALUES (?, 9, ?, ?, ?)',
+                 (amount, DAY, description, 'Expense'))
+
+
+class CopiedFileSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.original = os.path.join(self.tmp, 'original.db')
+        self.copy = os.path.join(self.tmp, 'copy.db')
+        init_db(self.original)
+        conn = sqlite3.connect(self.original)
+        add_transaction(conn, 'before copy', 1.0)
+        conn.commit()
+        conn.close()
+        shutil.copy(self.original, self.copy)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def rows(self, path):
+        conn = sqlite3.connect(path)
+        try:
+            transactions = conn.execute('SELECT description, amount FROM transactions ORDER BY description').fetchall()
+            categories = conn.execute('SELECT name, type FROM categories ORDER BY name').fetchall()
+        finally:
+            conn.close()
+        return transactions, categories
+
+    def test_edits_on_copy_reach_original(self):
+        conn = sqlite3.connect(self.copy)
+        conn.execute("INSERT INTO categories (name, type) VALUES ('Pets', 'Expense')")
+        add_transaction(conn, 'on copy', 5.0)
+        conn.execute("UPDATE transactions SET amount = 7.0 WHERE description = 'before copy'")
+        conn.commit()
+        conn.close()
+        conn = sqlite3.connect(self.original)
+        add_transaction(conn, 'on original', 3.0)
+        conn.commit()
+        conn.close()
+
+        sync.sync_files(self.original, self.copy)
+        sync.sync_files(self.original, self.copy)
+
+        transactions, categories = self.rows(self.original)
+        self.assertEqual(transactions, [('before copy', 7.0), ('on copy', 5.0), ('on original', 3.0)])
+        self.assertIn(('Pets', 'Expense'), categories)
+        self.assertEqual(self.rows(self.copy), (transactions, categories))
+
+    def test_copies_get_their_own_site(self):
+        sync.sync_files(self.original, self.copy)
+        original, copy = sqlite3.connect(self.original), sqlite3.connect(self.copy)
+        try:
+            self.assertNotEqual(sync.site_id(original), sync.site_id(copy))
+        finally:
+            original.close()
+            copy.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
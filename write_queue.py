@@ -0,0 +1,56 @@
+# Longest a write waits for its commit, and how many writes force one early
+WRITE_WINDOW_MS = 250
+WRITE_BATCH_OPS = 64
+
+
+class WriteQueue:
+    # Group commit for journal writes. Each write runs right away inside one open transaction, so
+    # the UI (on the same connection) sees it immediately and undo/listeners work as usual, but the
+    # COMMIT, and with it the fsync, happens once per window or once WRITE_BATCH_OPS writes are
+    # queued. schedule(ms, callback) arms the window timer (Tk's after() in the app). Anything that
+    # needs the writes on disk, uses another connection (backups, restore, archiving, closing) or
+    # commits on its own outside the journal (settings, budget limits, rules) calls flush() first.
+
+    def __init__(self, journal, schedule, window_ms=WRITE_WINDOW_MS, max_ops=WRITE_BATCH_OPS):
+        self.journal = journal
+        self.conn = journal.conn
+        self.schedule = schedule
+        self.window_ms = window_ms
+        self.max_ops = max_ops
+        self.pending = 0
+        self.commits = 0
+        self._armed = False
+
+    def submit(self, write, *args, **kwargs):
+        # Runs write(*args, **kwargs) (a journal method) in the open batch and returns its result.
+        # A write that raises is rolled back on its own (journal groups are savepoints); the rest of
+        # the batch stays queued. If it was the only write, the batch is closed right away so a
+        # failed write never leaves an open transaction that no timer will commit.
+        if not self.conn.in_transaction:
+            self.conn.execute('BEGIN')
+        self.journal.deferred = True
+        try:
+            result = write(*args, **kwargs)
+        except BaseException:
+            if not self.pending:
+                self.flush()
+            raise
+        self.pending += 1
+        if self.pending >= self.max_ops:
+            self.flush()
+        elif not self._armed:
+            self._armed = True
+            self.schedule(self.window_ms, self._window_elapsed)
+        return result
+
+    def _window_elapsed(self):
+        self._armed = False
+        self.flush()
+
+    def flush(self):
+        # Commits every queued write; safe to call at any time
+        self.journal.deferred = False
+        if self.conn.in_transaction:
+            self.conn.commit()
+            self.commits += 1
+        self.pending = 0